@@ -1,376 +1,15 @@
-import json
-import random
-import math
-import sys
 import os
-import glob
+import sys
 import pickle
 import argparse
 
-from PIL import Image
-from sty import fg, bg, ef, rs, Style, RgbFg
-
-def generate_new_level(height, width, model, wrapping=False, max_attempts = 5):
-	
-	pattern_occurrences = model["pattern_counts"]
-	possible_patterns = list(pattern_occurrences.keys())
-	allowed_adjacencies = model["allowed_adjacencies"]
-
-	for key in allowed_adjacencies.keys():
-		for direction in allowed_adjacencies[key].keys():
-			allowed_adjacencies[key][direction] = [pattern_to_tuple(p) for p in allowed_adjacencies[key][direction]]
-
-	domain = model["domain"]
-
-
-	i=0
-	while i < max_attempts:
-		level = initialize_level(height, width, possible_patterns)
-
-		possible_positions = get_observable_positions(level, pattern_occurrences)
-		
-		while len(possible_positions) > 0:
-			pos, pat = observe(level, pattern_occurrences, possible_positions)
-
-			level[pos[0]][pos[1]] = [pat]
-			print_level_in_progress(level, domain)
-
-			level = propagate(level, possible_patterns, allowed_adjacencies, 
-												pattern_occurrences, wrapping)
-
-
-
-			possible_positions = get_observable_positions(level, pattern_occurrences)
-		
-		if not is_valid_level(level):
-			print(f"Contradiction reached during sampling. A position in the level "+
-				"has 0 possible patterns. Generation attempt {i} failed.")
-			i+=1
-		else:
-			break
-			
-	return finalize_level(level)
-
-def initialize_level(height, width, possible_patterns):
-
-	level = [[possible_patterns for column in range(width)]
-									for row in range(height)]
-
-	return level
-
-# check if there are any positions with 0 options available
-def is_valid_level(level):
-	for row in level:
-		for cell in row:
-			if len(cell) == 0:
-				return False
-
-	return True
-
-def pattern_to_tuple(pattern):
-	flattened_pattern = [tile for row in pattern for tile in row]
-	pattern_as_tuple = tuple(flattened_pattern)
-
-	return pattern_as_tuple
-
-def get_observable_positions(level, pattern_occurrences):
-	# gather the positions with the fewest available options
-	lowest_entropy = float("inf")
-	possible_positions = []
-	for row_index in range(len(level)):
-		for col_index in range(len(level[row_index])):
-			
-
-			entropy = compute_shannon_entropy(level[row_index][col_index],
-														pattern_occurrences)
-
-			# either a fail state (no options), or a collapsed state (1 option)
-			if entropy == 0:
-				if len(level[row_index][col_index]) == 0:
-					print("Ran into a fail case; no options available for a "+
-						"position. Restarting generation.")
-					return []
-				else:
-					# not a fail state, this position is just already collapsed
-					continue
-			# new lowest entropy position found, overwrite possible positions
-			elif entropy < lowest_entropy:
-				lowest_entropy = entropy
-				possible_positions = [[row_index,col_index]]
-
-			# position with the same as current lowest entropy,
-			# append to possible positions
-			elif entropy == lowest_entropy:
-				possible_positions.append([row_index,col_index])
-			
-			# entropy is higher than current lowest entropy, skip position
-			else:
-				continue
-
-	return possible_positions
-
-def observe(level, pattern_occurrences, possible_positions):
-	# randomly choose which position to collapse
-	position = random.choice(possible_positions)
-	
-	# get the possible patterns at the chosen position
-	possible_patterns_at_position = level[position[0]][position[1]]
-
-	# construct a weighted choice for those patters based on occurrences
-	weights = [pattern_occurrences[pattern_to_tuple(pattern)] 
-								for pattern in possible_patterns_at_position]
-
-	total_weight = sum(weights)
-	weights=[weight/total_weight for weight in weights]
-
-	chosen_pattern = random.choices(possible_patterns_at_position, 
-									weights=weights, 
-									k=1)[0]
-
-	return position, chosen_pattern
-
-def compute_shannon_entropy(patterns, occurrences):
-	pattern_counts = [occurrences[pattern_to_tuple(pat)] for pat in patterns]
-	
-	total = sum(pattern_counts)
-	pattern_counts = [count/total for count in pattern_counts]
-
-	shannon_entropy = -sum([count*math.log(count) for count in pattern_counts])
-
-	return shannon_entropy
-
-# for every position, 
-	#	get the patterns allowed at that position
-	#	get the patterns allowed at surrounding positions given those patterns
-	#	remove at patterns at the surrounding positions that are not allowed
-	#	repeat this while any changes are made to the allowed patterns 
-def propagate(level, patterns, allowed_adjacencies, pattern_occurrences, wrapping):
-	still_updating = True
-	i=0
-	while still_updating:
-		i+=1
-		still_updating = False
-
-		#get all positions sorted by entropy
-		positions = [(r,c) for r in range(len(level)) 
-										for c in range(len(level[0]))]
-
-		sorted_positions = []
-		for pos in positions:
-			entropy = compute_shannon_entropy(level[pos[0]][pos[1]],
-												pattern_occurrences)
-
-			if len(sorted_positions) == 0:
-				sorted_positions.append((pos,entropy))
-			else:
-				index = 0
-				while index < len(sorted_positions) and \
-										entropy > sorted_positions[index][1]:
-					index += 1
-				if index < len(sorted_positions):
-					sorted_positions.insert(index, (pos,entropy))
-				else:
-					sorted_positions.append((pos,entropy))
-
-
-		for pos,_ in sorted_positions:
-			r = pos[0]
-			c = pos[1]
-
-			allowed_above = []
-			if wrapping:
-				current_allowed_above = {pattern_to_tuple(pat) for pat in level[(r-1)%len(level)][c]}
-			elif not wrapping and r > 0:
-				current_allowed_above = {pattern_to_tuple(pat) for pat in level[r-1][c]}
-			# if not wrapping, assume anything can be placed out of bounds
-			elif not wrapping and r <= 0:
-				current_allowed_above = {pattern_to_tuple(pat) for pat in patterns}
-			
-			allowed_below = []
-			if wrapping:
-				current_allowed_below = {pattern_to_tuple(pat) for pat in level[(r+1)%len(level)][c]}
-			elif not wrapping and r < len(level)-1:
-				current_allowed_below = {pattern_to_tuple(pat) for pat in level[r+1][c]}
-			# if not wrapping, assume anything can be placed out of bounds
-			elif not wrapping and r >= len(level):
-				current_allowed_below = {pattern_to_tuple(pat) for pat in patterns}
-
-			allowed_left = []
-			if wrapping:
-				current_allowed_left = {pattern_to_tuple(pat) for pat in level[r][(c-1)%len(level[r])]}
-			elif not wrapping and c > 0:
-				current_allowed_left = {pattern_to_tuple(pat) for pat in level[r][c-1]}
-			# if not wrapping, assume anything can be placed out of bounds
-			elif not wrapping and c <= 0:
-				current_allowed_left = {pattern_to_tuple(pat) for pat in patterns}
-
-			allowed_right = []
-			if wrapping:
-				current_allowed_right = {pattern_to_tuple(pat) for pat in level[r][(c+1)%len(level[r])]}
-			elif not wrapping and c < len(level[0])-1:
-				current_allowed_right = {pattern_to_tuple(pat) for pat in level[r][c+1]}
-			# if not wrapping, assume anything can be placed out of bounds
-			elif not wrapping and c >= len(level[0]):
-				current_allowed_right = {pattern_to_tuple(pat) for pat in patterns}
-			
-			allowed_above = {pattern_to_tuple(pat_above) for pat_curr in level[r][c] for pat_above in allowed_adjacencies[pattern_to_tuple(pat_curr)]["above"]}
-			allowed_below = {pattern_to_tuple(pat_below) for pat_curr in level[r][c] for pat_below in allowed_adjacencies[pattern_to_tuple(pat_curr)]["below"]}
-			allowed_left = {pattern_to_tuple(pat_left) for pat_curr in level[r][c] for pat_left in allowed_adjacencies[pattern_to_tuple(pat_curr)]["left"]}
-			allowed_right = {pattern_to_tuple(pat_right) for pat_curr in level[r][c] for pat_right in allowed_adjacencies[pattern_to_tuple(pat_curr)]["right"]}
-
-			if wrapping:
-				level[(r-1)%len(level)][c] = list(allowed_above.intersection(current_allowed_above))
-				level[(r+1)%len(level)][c] = list(allowed_below.intersection(current_allowed_below))
-				level[r][(c-1)%len(level[r])] = list(allowed_left.intersection(current_allowed_left))
-				level[r][(c+1)%len(level[r])] = list(allowed_right.intersection(current_allowed_right))
-
-				if len(level[(r-1)%len(level)][c]) < len(current_allowed_above) or \
-					len(level[(r+1)%len(level)][c]) < len(current_allowed_below) or \
-					len(level[r][(c-1)%len(level[r])]) < len(current_allowed_left) or \
-					len(level[r][(c+1)%len(level[r])]) < len(current_allowed_right):
-					still_updating = True
-			else:
-				if r > 0:
-					level[r-1][c] = list(allowed_above.intersection(current_allowed_above))
-					if len(level[r-1][c]) < len(current_allowed_above):
-						still_updating = True
-				if r < len(level)-1:
-					level[r+1][c] = list(allowed_below.intersection(current_allowed_below))
-					if len(level[r+1][c]) < len(current_allowed_below):
-						still_updating = True
-				if c > 0:
-					level[r][c-1] = list(allowed_left.intersection(current_allowed_left))
-					if len(level[r][c-1]) < len(current_allowed_left):
-						still_updating = True
-				if c < len(level[0])-1:
-					level[r][c+1] = list(allowed_right.intersection(current_allowed_right))
-					if len(level[r][c+1]) < len(current_allowed_right):
-						still_updating = True
-		
-	return level
-
-
-
-def finalize_level(level):
-
-	final_level = [[cell[0][0][0] for cell in row] for row in level]
-
-	return final_level
-
-def print_level_in_progress(level, domain):
-
-	level_in_progress = [[cell[0][0][0] if len(cell) == 1 else len(cell) for cell in row] for row in level]
-
-	if domain == "colors":
-		for row in level_in_progress:
-			for cell in row:
-				if cell == 'W':
-					color = fg.white
-				elif cell == 'R':
-					color = fg.red
-				elif cell == 'B':
-					color = fg.da_grey
-				else:
-					color = fg.da_yellow
-				print(color + f"{cell}", end=" ")
-			print("")
-		print("")
-		print(fg.rs+"")
-	
-	elif domain == "SMB":
-		for row in level_in_progress:
-			for cell in row:
-				if cell in ["X", "S"]:
-					color = fg.da_red
-				elif cell == "-":
-					color = fg.li_cyan
-				elif cell in ["?", "Q"]:
-					color = fg.yellow
-				elif cell == "E":
-					color = fg.red
-				elif cell in ["<", ">", "[", "]"]:
-					color = fg.green
-				elif cell == "o":
-					color = fg.li_yellow
-				elif cell in ["B", "b"]:
-					color = fg.da_grey
-				else:
-					color = fg.white
-				print(color + f"{cell}", end=" ")
-			print("")
-		print("")
-		print(fg.rs+"")
-	elif domain == "LR":
-		for row in level_in_progress:
-			for cell in row:
-				if cell == "B":
-					color = fg.da_red
-				elif cell == "b":
-					color = fg.red
-				elif cell == ".":
-					color = fg.da_grey
-				elif cell == "-":
-					color = fg.white
-				elif cell == "#":
-					color = fg.white
-				elif cell == "G":
-					color = fg.yellow
-				elif cell == "E":
-					color = fg.li_magenta
-				elif cell == "M":
-					color = fg.li_cyan
-				else:
-					color = fg.da_yellow
-				print(color + f"{cell}", end=" ")
-			print("")
-		print("")
-		print(fg.rs+"")
-
-	return level_in_progress
-
-# Visualize a Generated Level
-def visualize_level(level, sprite_mapping, sprites, background_color, level_name, level_number, domain):
-	
-	level_height = len(level)
-	level_width = len(level[0])
-
-	# sprites are max 18x18 pixels
-	viz_height =  18*level_height
-	viz_width =  18*level_width
-
-	# this creates the image for the level
-	image = Image.new("RGB", (viz_width, viz_height), color=background_color)
-	pixels = image.load()#this loads the level image's pixels so we can edit them
-
-
-	for y in range(0, level_height):
-		for x in range(0, level_width):
-			imageToUse = None
-			if level[y][x] in sprite_mapping.keys():
-				imageToUse = sprites[sprite_mapping[level[y][x]]]
-			
-			# Special handling to make SMB levels look nicer
-			elif level[y][x]=="X" and domain == "SMB":
-				#Rules about ensuring the right sprite is used
-				if y==level_height-2:
-					imageToUse = sprites["groundTop"]
-				elif y==level_height-1:
-					#Check if we have a solid tile above or not
-					if level[y-1][x]=="X":
-						imageToUse = sprites["groundBottom"]
-					else:
-						imageToUse = sprites["groundTop"]
-				else:
-					imageToUse = sprites["stair"]
-			
-			if not imageToUse == None:
-				pixelsToUse = imageToUse.load()
-				for x2 in range(0, 18):
-					for y2 in range(0, 18):
-						if pixelsToUse[x2,y2][3]>0:
-							pixels[x*18+x2,y*18+y2] = pixelsToUse[x2,y2][0:-1]
-
-	image.save(f'Output/{level_name}_{level_number}_viz.jpeg', "JPEG")
+from wfc.generation import generate_new_level, resume_generation, \
+					save_snapshot, load_snapshot, compile_model, check_level_size
+from wfc.output import OUTPUT_FORMATS, IMAGE_FORMATS, open_sink, \
+												default_extension
+from wfc.seeding import make_seed, derive_seed
+from wfc.cache import Cache
+from wfc.ensemble import merge_models, blend_model
 
 if __name__ == '__main__':
 
@@ -385,11 +24,25 @@ if __name__ == '__main__':
 	                    	'Defaults to "colors"')
 	parser.add_argument('--model_name',
 						type=str, 
+						nargs='+',
 	                    help='A string indicating the name of the trained model '+ 
 	                    	'to load. e.g., "super_cool_WFC_model". Note that the '+ 
 	                    	'file extension will be added automatically. Also ' +
 	                    	'if none is provided will default to '+
-	                    	'"trained_WFC_<domain>"')
+	                    	'"trained_WFC_<domain>". If several names are given, '+
+	                    	'the models are merged into an ensemble (see '+
+	                    	'wfc/ensemble.py) and "num_levels" levels are '+
+	                    	'generated from each of them, named '+
+	                    	'<level_name>_<model_name>_<number>, unless "blend" '+
+	                    	'is passed.')
+	parser.add_argument('--blend', 
+						type=float,
+						nargs='+',
+						help='Numbers indicating how much each of the models '+
+							'given with "model_name" (in the same order) is used '+
+							'when generating from several models. The levels are '+
+							'generated from a mix of the models\' pattern '+
+							'weights, e.g., "0.7 0.3" for mostly the first model.')
 	parser.add_argument('--wrapping', 
 						action='store_true',
 						dest="wrapping",
@@ -428,6 +81,101 @@ if __name__ == '__main__':
 	                    	'that the file extension and level number will be ' +
 	                    	'added automatically. Also if none is provided will ' +
 	                    	'default to "generated"')
+	parser.add_argument('--output_format',
+						type=str,
+						default="txt",
+						choices=OUTPUT_FORMATS,
+	                    help='A string indicating how the generated levels '+
+	                    	'are stored. "txt" writes one text file per level '+
+	                    	'to the output folder, "ndjson" writes one JSON '+
+	                    	'level per line of a single file, "tar" and "zip" '+
+	                    	'write a single archive, and "packed" writes a '+
+	                    	'single uint8 array file with an index file next '+
+	                    	'to it. Defaults to "txt"')
+	parser.add_argument('--output_path',
+						type=str,
+	                    help='A string indicating where the generated levels '+
+	                    	'are written. For the "txt" format this is a folder '+
+	                    	'and defaults to "Output", for the other formats it '+
+	                    	'is a file and defaults to "Output/<level_name>" '+
+	                    	'with the extension of the format.')
+	parser.add_argument('--compress',
+						action='store_true',
+						default=False,
+	                    help='A flag indicating if the generated levels '+
+	                    	'should be compressed (gzip for "txt", "ndjson", '+
+	                    	'"tar" and "packed", deflate for "zip").')
+	parser.add_argument('--images',
+						action='store_true',
+						dest="render_images",
+						default=None,
+	                    help='A flag indicating that the generated levels '+
+	                    	'should be rendered as images. Images are stored '+
+	                    	'inside "tar" and "zip" archives, and next to the '+
+	                    	'output for the other formats (one file per level). '+
+	                    	'Defaults to rendering images for "txt", "tar" and '+
+	                    	'"zip" if this and "no_images" are not set.')
+	parser.add_argument('--no_images',
+						action='store_false',
+						dest="render_images",
+						default=None,
+	                    help='A flag indicating that the generated levels '+
+	                    	'should not be rendered as images.')
+	parser.add_argument('--quiet',
+						action='store_true',
+						default=False,
+	                    help='A flag indicating that the levels should not be '+
+	                    	'printed to the terminal while they are generated.')
+	parser.add_argument('--hierarchical',
+						action='store_true',
+						default=False,
+	                    help='A flag indicating that the levels should be '+
+	                    	'generated region by region (see wfc/hierarchical.py). '+
+	                    	'Requires a model trained with "region_height".')
+	parser.add_argument('--processes', 
+						type=int,
+						help='An integer indicating how many processes are '+
+							'used to generate the regions of a hierarchical '+
+							'level. Defaults to the number of CPUs.')
+	parser.add_argument('--snapshot_every', 
+						type=int,
+						help='An integer indicating after how many observations '+
+							'a snapshot of the level being generated is saved to '+
+							'the snapshot folder, as <level_name>_<number>.snapshot. '+
+							'The snapshot is removed once the level is generated. '+
+							'No snapshots are saved if not passed.')
+	parser.add_argument('--snapshot_dir',
+						type=str, 
+						default="Snapshots",
+	                    help='A string indicating the folder snapshots are saved '+
+	                    	'to. Defaults to "Snapshots"')
+	parser.add_argument('--resume',
+						type=str, 
+	                    help='A string indicating the path of a snapshot to '+
+	                    	'continue generating from. The level is saved with '+
+	                    	'the name of the snapshot file, and "num_levels" and '+
+	                    	'the level size are ignored.')
+	parser.add_argument('--seed', 
+						type=int,
+						help='An integer used as the seed for generating the '+
+							'levels. Every level is generated from its own '+
+							'stream of the seed, so level <number> is the same '+
+							'for a given seed however many levels are generated. '+
+							'A random seed is used (and printed to stderr) if not '+
+							'passed.')
+	parser.add_argument('--cache_dir',
+						type=str, 
+	                    help='A string indicating a folder to cache the generated '+
+	                    	'levels in. Generating a level with the same model, '+
+	                    	'size and seed again loads it from the cache. Levels '+
+	                    	'are only cached if "seed" is passed, and no cache is '+
+	                    	'used if this is not passed.')
+	parser.add_argument('--cache_size', 
+						type=int,
+						default=256,
+						help='An integer indicating the size (in MB) the cache '+
+							'is kept under, by removing the least recently used '+
+							'entries. Defaults to 256.')
 
 	args = vars(parser.parse_args())
 
@@ -435,9 +183,26 @@ if __name__ == '__main__':
 	args = {key:value for key,value in args.items() if value is not None}
 
 	domain = args["domain"]
-	model_name = args.get("model_name", f"trained_WFC_{domain}")
+	model_names = args.get("model_name", [f"trained_WFC_{domain}"])
 	num_levels = args.get("num_levels", 1)
 	level_name = args.get("level_name", f"generated")
+	output_format = args["output_format"]
+	compress = args["compress"]
+	render_images = args.get("render_images", output_format in IMAGE_FORMATS)
+	verbose = not args["quiet"]
+
+	# without a seed no level is ever generated again, so the levels are only
+	# cached if a seed is given
+	if "cache_dir" in args and "seed" in args:
+		cache = Cache(args["cache_dir"], max_size=args["cache_size"]*1024*1024)
+	else:
+		cache = None
+
+	if output_format == "txt":
+		output_path = args.get("output_path", "Output")
+	else:
+		extension = default_extension(output_format, compress)
+		output_path = args.get("output_path", f"Output/{level_name}.{extension}")
 
 	if domain == "SMB":
 		wrapping = args.get("wrapping", False)
@@ -490,28 +255,145 @@ if __name__ == '__main__':
 			f"but {domain} was given.")
 		exit()
 
-	trained_model = pickle.load(open(f"{model_name}.pickle", "rb"))
-	if trained_model["domain"] != domain:
-		print("trained model's domain must match the target domain")
-		print(f"trained model: {trained_model['domain']}, target: {domain}")
+	# the models are named by their file names, which the level names and 
+	# the blend refer to
+	member_names = [os.path.basename(model_name) for model_name in model_names]
+	for index, name in enumerate(member_names):
+		if name in member_names[:index]:
+			print(f"the models must have different file names, but "+
+				f"'{model_names[member_names.index(name)]}' and "+
+				f"'{model_names[index]}' are both named '{name}'.")
+			exit()
+
+	if "blend" in args and len(model_names) == 1:
+		print("'blend' requires several models to be given with 'model_name', "+
+			"but only one was given.")
 		exit()
 
-	#Load sprites
-	sprites = {}
-	for filename in glob.glob(f"./Sprites/{domain}/*.png"):
-		im = Image.open(filename)
-		name = filename.split("/")[-1].split(".")[0]
-		sprites[name] = im.convert('RGBA')
+	trained_models = {}
+	for model_name, name in zip(model_names, member_names):
+		trained_model = pickle.load(open(f"{model_name}.pickle", "rb"))
+		if trained_model["domain"] != domain:
+			print("trained model's domain must match the target domain")
+			print(f"trained model: {trained_model['domain']}, target: {domain}")
+			exit()
+		trained_models[name] = trained_model
+
+	# the models the levels are generated from, as (name, model) pairs, where 
+	# the name is only given when there are several
+	if len(trained_models) == 1:
+		generators = [(None, trained_model)]
+	else:
+		ensemble = merge_models(trained_models)
+		if "blend" in args:
+			if len(args["blend"]) != len(trained_models):
+				print(f"'blend' must have a value for each of the "+
+					f"{len(trained_models)} models, but {len(args['blend'])} "+
+					"were given.")
+				exit()
+			blend = dict(zip(ensemble["members"], args["blend"]))
+			generators = [(None, blend_model(ensemble, blend))]
+		else:
+			generators = [(name, blend_model(ensemble, name)) 
+											for name in ensemble["members"]]
+
+	if verbose:
+		from wfc.display import print_level_in_progress
+
+	#Load sprites, only needed if the levels are rendered
+	if render_images:
+		from wfc.render import render_level, load_sprites
+		sprites = load_sprites(domain)
+
+	if "resume" not in args:
+		try:
+			check_level_size(level_height, level_width, 
+								compile_model(generators[0][1]), wrapping)
+		except ValueError as error:
+			print(error)
+			exit()
+
+	# a single pool of worker processes generates the regions of all the levels
+	region_pool = None
+	if args["hierarchical"]:
+		from wfc.hierarchical import generate_hierarchical_level, \
+														create_region_pool
+		if any("regions" not in model for name, model in generators):
+			print("hierarchical generation requires a model trained with regions")
+			exit()
+		if args.get("processes") != 1:
+			region_pool = create_region_pool([model for name, model in generators],
+														args.get("processes"))
+
+	# a random seed is always reported (on stderr, so it's also shown with 
+	# --quiet), so the levels can be generated again
+	if "seed" in args:
+		seed = args["seed"]
+	else:
+		seed = make_seed()
+		if "resume" not in args:
+			print(f"Generating with seed {seed}", file=sys.stderr)
+
+	snapshot_every = args.get("snapshot_every")
+	# the levels to generate as (name, model, seed) triples, every level has 
+	# its own stream of the seed
+	if "resume" in args:
+		if len(generators) > 1:
+			print("resuming with several models requires 'blend', so the "+
+										"level is resumed with a single model")
+			exit()
+		levels = [(os.path.basename(args["resume"]).split(".")[0], 
+												generators[0][1], None)]
+	else:
+		levels = []
+		for generator_name, model in generators:
+			for level_number in range(num_levels):
+				if generator_name is None:
+					levels.append((f"{level_name}_{level_number}", model, 
+									derive_seed(seed, "level", level_number)))
+				else:
+					levels.append((f"{level_name}_{generator_name}_{level_number}",
+									model, derive_seed(seed, "level", 
+											generator_name, level_number)))
+
+	with open_sink(output_format, output_path, compress=compress) as sink:
+		for name, trained_model, level_seed in levels:
+			snapshot_path = os.path.join(args["snapshot_dir"], f"{name}.snapshot")
+			on_snapshot = lambda snapshot: save_snapshot(snapshot, snapshot_path)
+
+			if "resume" in args:
+				snapshot = load_snapshot(args["resume"])
+				level = resume_generation(snapshot, trained_model, verbose=verbose,
+									snapshot_every=snapshot_every, 
+									on_snapshot=on_snapshot)
+			elif args["hierarchical"]:
+				level = generate_hierarchical_level(level_height, level_width, 
+									trained_model, wrapping=wrapping, max_attempts=5,
+									processes=args.get("processes"), rng=level_seed,
+									cache=cache, pool=region_pool)
+			else:
+				level = generate_new_level(level_height, level_width, trained_model, 
+									wrapping=wrapping, max_attempts=5, 
+									verbose=verbose, rng=level_seed, 
+									snapshot_every=snapshot_every, 
+									on_snapshot=on_snapshot, cache=cache)
+			if level is None:
+				print(f"Failed to generate level {name}.")
+				continue
+
+			# the snapshot of a failed level is kept, so it can be looked at
+			if snapshot_every and os.path.exists(snapshot_path):
+				os.remove(snapshot_path)
 
-	for level_number in range(num_levels):
-		level = generate_new_level(level_height, level_width, trained_model, 
-												wrapping=wrapping, max_attempts=5)
+			if verbose:
+				print_level_in_progress(level, domain)
 
-		print_level_in_progress(level, trained_model["domain"])
+			sink.write_level(name, level)
+			if render_images:
+				image = render_level(level, sprite_mapping, sprites, 
+												background_color, domain)
+				sink.write_image(name, image)
 
-		with open(f'Output/{level_name}_{level_number}.txt', 'w') as output:
-			for row in level:
-				for cell in row:
-					output.write(cell)
-				output.write('\n')
-		visualize_level(level, sprite_mapping, sprites, background_color, level_name, level_number, domain)
+	if region_pool is not None:
+		region_pool.close()
+		region_pool.join()
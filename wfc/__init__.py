@@ -0,0 +1,13 @@
+# WaveFunctionCollapse level generation.
+#
+# Training and generation only need the standard library. Printing levels in
+# color (wfc.display) and rendering them as images (wfc.render) need sty and 
+# Pillow, and are only imported when they are used.
+from wfc.patterns import pattern_to_tuple
+from wfc.training import load_colors_domain, load_examples, train_model, \
+										train_region_model
+from wfc.generation import generate_new_level, resume_generation, \
+								compile_model, save_snapshot, load_snapshot
+from wfc.seeding import make_seed, derive_seed
+from wfc.cache import Cache
+from wfc.ensemble import merge_models, blend_model
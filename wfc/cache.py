@@ -0,0 +1,157 @@
+import os
+import pickle
+import hashlib
+
+from wfc.generation import compile_model
+
+
+# An on-disk cache of trained models and generated levels. Every entry is a
+# pickle file named by the hash of the inputs it was computed from (see
+# 'hash_key'), so the same training examples and arguments, or the same model,
+# generation arguments and seed, give the same entry. The entries are evicted
+# least recently used first once the cache is larger than 'max_size' bytes;
+# the time an entry was last used is kept as its file's modification time.
+#
+# 'train_model', 'train_region_model', 'generate_new_level' and
+# 'generate_hierarchical_level' take a 'cache' argument to use it. Levels are
+# only cached when they are generated with a seed (see wfc/seeding.py), since
+# without one every generation is different.
+
+# Changing how models are trained or levels are generated changes the results
+# for the same inputs, so this is part of every key. Bump it when that happens.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# When the cache grows larger than its max size, the least recently used 
+# entries are removed until it is this fraction of the max size, so the cache
+# folder is only scanned once every few entries rather than on every 'put'
+EVICTION_TARGET = 0.9
+
+# The key of the entry for the given inputs. The inputs are hashed by their
+# repr, which is the same in every process for the lists, tuples, dicts
+# (in insertion order), strings, numbers and arrays used here.
+def hash_key(*inputs):
+	return hashlib.sha256(repr((CACHE_VERSION,) + inputs).encode()).hexdigest()
+
+# The hash of a trained model, computed once and kept with its compiled model
+def model_hash(model):
+	compiled_model = compile_model(model)
+	if "hash" not in compiled_model:
+		compiled_model["hash"] = hash_key(without_compiled(model))
+	return compiled_model["hash"]
+
+# the model without the compiled models generation adds to it
+def without_compiled(model):
+	model = {key:value for key,value in model.items() if key != "compiled"}
+	if "regions" in model:
+		model["regions"] = dict(model["regions"],
+						model=without_compiled(model["regions"]["model"]))
+	return model
+
+class Cache:
+	def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+		self.directory = directory
+		self.max_size = max_size
+		os.makedirs(directory, exist_ok=True)
+
+		# the total size of the entries, kept up to date as entries are added 
+		# and removed. Entries added by other processes are counted the next 
+		# time the folder is scanned.
+		self.size = sum(size for _, size, _ in self.scan())
+
+	# the (last used time, size, path) of every entry
+	def scan(self):
+		entries = []
+		with os.scandir(self.directory) as scan:
+			for entry in scan:
+				if entry.name.endswith(".pickle"):
+					try:
+						stat = entry.stat()
+					except FileNotFoundError:
+						continue
+					entries.append((stat.st_mtime, stat.st_size, entry.path))
+		return entries
+
+	def path(self, key):
+		return os.path.join(self.directory, f"{key}.pickle")
+
+	# The value stored with 'key', or 'default' if there is none. Entries that
+	# can't be read (e.g., left by an older version) are removed.
+	def get(self, key, default=None):
+		path = self.path(key)
+		try:
+			with open(path, "rb") as fp:
+				value = pickle.load(fp)
+		except FileNotFoundError:
+			return default
+		except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+			self.remove(path)
+			return default
+
+		# mark the entry as the most recently used
+		try:
+			os.utime(path)
+		except FileNotFoundError:
+			pass
+
+		return value
+
+	def put(self, key, value):
+		data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+		if len(data) > self.max_size:
+			return
+
+		# written to a temporary file first, so a cache shared between processes
+		# never has a partially written entry
+		path = self.path(key)
+		temporary_path = f"{path}.{os.getpid()}.tmp"
+		with open(temporary_path, "wb") as fp:
+			fp.write(data)
+		self.size -= self.entry_size(path)
+		os.replace(temporary_path, path)
+		self.size += len(data)
+
+		if self.size > self.max_size:
+			self.evict()
+
+	# The value stored with 'key', or the result of 'compute()', which is
+	# stored unless it is None
+	def get_or_compute(self, key, compute):
+		value = self.get(key)
+		if value is None:
+			value = compute()
+			if value is not None:
+				self.put(key, value)
+		return value
+
+	# Remove the least recently used entries until the cache is down to 
+	# EVICTION_TARGET of max_size
+	def evict(self):
+		entries = self.scan()
+		self.size = sum(size for _, size, _ in entries)
+
+		entries.sort()
+		for _, size, path in entries:
+			if self.size <= self.max_size * EVICTION_TARGET:
+				break
+			self.remove(path)
+
+	def entry_size(self, path):
+		try:
+			return os.stat(path).st_size
+		except FileNotFoundError:
+			return 0
+
+	def remove(self, path):
+		size = self.entry_size(path)
+		try:
+			os.remove(path)
+		except FileNotFoundError:
+			return
+		self.size -= size
+
+	def clear(self):
+		for _, _, path in self.scan():
+			self.remove(path)
+		self.size = 0
@@ -0,0 +1,73 @@
+from sty import fg
+
+
+# print the level, or the level in progress, to the terminal
+def print_level_in_progress(level_in_progress, domain):
+
+
+	if domain == "colors":
+		for row in level_in_progress:
+			for cell in row:
+				if cell == 'W':
+					color = fg.white
+				elif cell == 'R':
+					color = fg.red
+				elif cell == 'B':
+					color = fg.da_grey
+				else:
+					color = fg.da_yellow
+				print(color + f"{cell}", end=" ")
+			print("")
+		print("")
+		print(fg.rs+"")
+	
+	elif domain == "SMB":
+		for row in level_in_progress:
+			for cell in row:
+				if cell in ["X", "S"]:
+					color = fg.da_red
+				elif cell == "-":
+					color = fg.li_cyan
+				elif cell in ["?", "Q"]:
+					color = fg.yellow
+				elif cell == "E":
+					color = fg.red
+				elif cell in ["<", ">", "[", "]"]:
+					color = fg.green
+				elif cell == "o":
+					color = fg.li_yellow
+				elif cell in ["B", "b"]:
+					color = fg.da_grey
+				else:
+					color = fg.white
+				print(color + f"{cell}", end=" ")
+			print("")
+		print("")
+		print(fg.rs+"")
+	elif domain == "LR":
+		for row in level_in_progress:
+			for cell in row:
+				if cell == "B":
+					color = fg.da_red
+				elif cell == "b":
+					color = fg.red
+				elif cell == ".":
+					color = fg.da_grey
+				elif cell == "-":
+					color = fg.white
+				elif cell == "#":
+					color = fg.white
+				elif cell == "G":
+					color = fg.yellow
+				elif cell == "E":
+					color = fg.li_magenta
+				elif cell == "M":
+					color = fg.li_cyan
+				else:
+					color = fg.da_yellow
+				print(color + f"{cell}", end=" ")
+			print("")
+		print("")
+		print(fg.rs+"")
+
+	return level_in_progress
@@ -0,0 +1,129 @@
+from wfc.training import compute_adjacencies
+from wfc.generation import compile_model, with_weights
+
+
+# Generating from several models trained on the same tiles, e.g., one model per
+# family of levels, without loading and compiling each of them separately. The
+# models are merged into an ensemble, a single model over the union of their
+# patterns, which keeps the weights every model gives to the patterns
+#	"members" - the names of the models, in the order they were merged
+#	"member_weights" - for every model, the number of times each pattern of the
+#				ensemble occurs in that model's examples (0 if it doesn't)
+# The pattern counts of the ensemble are the sums over all of the models, so
+# the ensemble itself generates levels like a model trained on all of their
+# examples. 'blend_model' gives a model that generates with the weights of one
+# of the models, or a mix of them.
+#
+# Every pattern is stored once however many models it occurs in, and the
+# models share the ensemble's compiled adjacencies, so memory and the time to
+# compile grow with the number of distinct patterns. Since whether two patterns
+# can be placed next to each other only depends on the patterns, the
+# adjacencies are computed for the union of the patterns (which also allows
+# the patterns of different models to be placed next to each other in a blend).
+
+# The settings the models must share to be merged
+SHARED_SETTINGS = ["domain", "pattern_height", "pattern_width",
+												"row_offset", "col_offset"]
+
+# Merge the models, given as a dict of name -> trained model
+def merge_models(models):
+	if len(models) == 0:
+		raise ValueError("at least one model is needed to make an ensemble")
+
+	# the models aren't compiled, so only the merged model's compiled 
+	# adjacencies are ever built. Older models don't store the offsets, which
+	# were always 1.
+	names = list(models.keys())
+	member_settings = [{key: models[name].get(key, 1) for key in SHARED_SETTINGS}
+															for name in names]
+	settings = member_settings[0]
+	for name, model_settings in zip(names, member_settings):
+		for key in SHARED_SETTINGS:
+			if model_settings[key] != settings[key]:
+				raise ValueError(f"the models must have the same {key} to be "+
+					f"merged, but '{name}' has {model_settings[key]} and "+
+					f"'{names[0]}' has {settings[key]}.")
+
+	# the index of every pattern in the ensemble, in the order they are first
+	# seen
+	pattern_indices = {}
+	for name in names:
+		for pattern in models[name].get("patterns", 
+										list(models[name]["pattern_counts"])):
+			pattern_indices.setdefault(pattern, len(pattern_indices))
+	patterns = list(pattern_indices.keys())
+
+	member_weights = {}
+	pattern_counts = [0] * len(patterns)
+	for name in names:
+		weights = [0] * len(patterns)
+		for pattern, weight in models[name]["pattern_counts"].items():
+			index = pattern_indices[pattern]
+			weights[index] = weight
+			pattern_counts[index] += weight
+		member_weights[name] = weights
+
+	# the patterns are stored flattened (see 'pattern_to_tuple'), and are 
+	# split back into rows to compute the adjacencies
+	pattern_width = settings["pattern_width"]
+	pattern_rows = [[pattern[row:row + pattern_width] 
+						for row in range(0, len(pattern), pattern_width)]
+												for pattern in patterns]
+
+	ensemble = dict(settings)
+	ensemble.update({
+			"patterns": patterns,
+			"sparse_adjacencies": compute_adjacencies(pattern_rows,
+										row_offset=settings["row_offset"],
+										col_offset=settings["col_offset"]),
+			"pattern_counts": dict(zip(patterns, pattern_counts)),
+			"members": names,
+			"member_weights": member_weights
+			})
+
+	return ensemble
+
+# The weight of every pattern of the ensemble in a blend of its models, given
+# as a model name or a dict of model name -> blend weight. In a blend, the
+# weights of each model are normalized to sum to 1 before they are mixed, so
+# a model's share of the blend doesn't depend on how many examples it was
+# trained on. Patterns that only occur in models that aren't in the blend get
+# a weight of 0, and aren't placed.
+def get_blend_weights(ensemble, blend):
+	member_weights = ensemble["member_weights"]
+	if not isinstance(blend, dict):
+		blend = {blend: 1}
+
+	unknown = [name for name in blend if name not in member_weights]
+	if unknown:
+		raise ValueError(f"the ensemble has no model named {unknown[0]}, the "+
+								f"models are {ensemble['members']}.")
+
+	weights = [0] * len(ensemble["patterns"])
+	for name, share in blend.items():
+		total = sum(member_weights[name])
+		if share <= 0 or total == 0:
+			continue
+		for index, weight in enumerate(member_weights[name]):
+			if weight:
+				weights[index] += share * weight / total
+
+	return weights
+
+# A model which can be passed to 'generate_new_level' (and cached, see
+# wfc/cache.py) that generates with the weights of a blend of the ensemble's
+# models (see 'get_blend_weights'). It shares the ensemble's patterns and
+# compiled adjacencies, so making one doesn't recompile anything.
+def blend_model(ensemble, blend):
+	weights = get_blend_weights(ensemble, blend)
+	if not any(weights):
+		raise ValueError("the blend must give a positive weight to at least "+
+															"one of the models")
+
+	model = {key:value for key,value in ensemble.items()
+							if key not in ("member_weights", "compiled")}
+	model["pattern_counts"] = dict(zip(ensemble["patterns"], weights))
+	model["blend"] = blend
+	model["compiled"] = with_weights(compile_model(ensemble), weights)
+
+	return model
@@ -0,0 +1,648 @@
+import os
+import math
+import array
+import zlib
+import random
+
+from wfc.patterns import pattern_to_tuple
+from wfc.seeding import make_seed, substream
+
+
+# The directions a position's neighbors can be in. The index of a direction is
+# used to look it up in the compiled adjacencies and the neighbor tables, and 
+# the opposite direction of direction d is always d^1
+DIRECTIONS = ["above", "below", "left", "right"]
+DIRECTION_STEPS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+
+# Entropies closer than this are considered equal when looking for the 
+# positions with the lowest entropy
+ENTROPY_TOLERANCE = 1e-9
+
+# The patterns are placed on a lattice with the model's row and column offsets
+# between neighboring positions, so every position of the level being 
+# generated covers a row_offset X col_offset block of tiles. A height X width
+# level is generated from a ceil(height/row_offset) X ceil(width/col_offset)
+# lattice, and then cropped to height X width tiles. A wrapping level wraps
+# around on the lattice, so its size must be a multiple of the offsets (see
+# 'check_level_size').
+# If verbose, the level in progress is printed after every observation (which
+# imports the colored terminal output, see wfc/display.py).
+# The random choices are made with a seed drawn from 'rng' (see wfc/seeding.py)
+# and every generation attempt samples from its own stream of that seed, so
+# the same seed always gives the same level.
+# If 'snapshot_every' is set, 'on_snapshot' is called with a snapshot of the
+# generation (see 'create_snapshot') after every 'snapshot_every' observations,
+# which can be continued later with 'resume_generation'.
+# If a cache is given (see wfc/cache.py) and 'rng' isn't None, the level is 
+# looked up by the model, the arguments and the seed before it is generated.
+def generate_new_level(height, width, model, wrapping=False, max_attempts = 5,
+						verbose=False, rng=None, snapshot_every=None, 
+						on_snapshot=None, cache=None):
+	check_snapshot_arguments(snapshot_every, on_snapshot)
+	check_level_size(height, width, compile_model(model), wrapping)
+
+	settings = {
+				"domain": model["domain"],
+				"height": height,
+				"width": width,
+				"wrapping": wrapping,
+				"max_attempts": max_attempts,
+				"seed": make_seed(rng)
+				}
+
+	generate = lambda: run_attempts(settings, model, 0, None, None, verbose, 
+											snapshot_every, on_snapshot)
+	if cache is None or rng is None:
+		return generate()
+
+	from wfc.cache import hash_key, model_hash
+	return cache.get_or_compute(hash_key("level", model_hash(model), settings),
+																	generate)
+
+# Continue a generation from a snapshot, with the model it was taken from. 
+# The random choices continue from the snapshot's random state, and the later
+# attempts use the streams of the snapshot's seed, so resuming gives the same 
+# level the original generation would have.
+def resume_generation(snapshot, model, verbose=False, snapshot_every=None, 
+														on_snapshot=None):
+	from wfc.cache import model_hash
+
+	check_snapshot_arguments(snapshot_every, on_snapshot)
+
+	if snapshot["settings"]["domain"] != model["domain"]:
+		raise ValueError("the snapshot was taken in the "+
+			f"{snapshot['settings']['domain']} domain, but the given model is "+
+			f"for the {model['domain']} domain.")
+
+	compiled_model = compile_model(model)
+	if snapshot["num_patterns"] != len(compiled_model["patterns"]) or \
+								snapshot["model"] != model_hash(model):
+		raise ValueError("the snapshot was taken with a different model than "+
+			"the given model (e.g., another blend of an ensemble, see "+
+			"wfc/ensemble.py).")
+
+	rng = random.Random()
+	rng.setstate(snapshot["rng_state"])
+
+	level = restore_level(snapshot, compiled_model)
+
+	return run_attempts(snapshot["settings"], model, snapshot["attempt"], level,
+								rng, verbose, snapshot_every, on_snapshot)
+
+# The lattice of a wrapping level wraps around after a whole number of 
+# row_offset X col_offset blocks, so if the level size isn't a multiple of the
+# offsets, cropping it would leave edges that don't wrap around
+def check_level_size(height, width, compiled_model, wrapping):
+	row_offset = compiled_model["row_offset"]
+	col_offset = compiled_model["col_offset"]
+	if wrapping and (height % row_offset or width % col_offset):
+		raise ValueError("the size of a wrapping level must be a multiple of "+
+			f"the model's offsets ({row_offset}, {col_offset}), but a "+
+			f"{height}x{width} level was given.")
+
+def check_snapshot_arguments(snapshot_every, on_snapshot):
+	if snapshot_every and on_snapshot is None:
+		raise ValueError("'on_snapshot' must be given to take snapshots with "+
+															"'snapshot_every'")
+
+# Run the generation attempts from 'first_attempt' on, the first of which 
+# continues from 'level' with 'rng' if they are given. Every other attempt 
+# samples from the stream of the settings' seed for its attempt number.
+def run_attempts(settings, model, first_attempt, level, rng, verbose,
+											snapshot_every, on_snapshot):
+	compiled_model = compile_model(model)
+	height = settings["height"]
+	width = settings["width"]
+
+	lattice_height = -(-height // compiled_model["row_offset"])
+	lattice_width = -(-width // compiled_model["col_offset"])
+
+	if verbose:
+		from wfc.display import print_level_in_progress
+
+	# the snapshots are matched to the model they were taken with by its hash
+	if snapshot_every:
+		from wfc.cache import model_hash
+		model_key = model_hash(model)
+
+	def on_step(level):
+		if verbose:
+			print_level_in_progress(get_level_in_progress(level, compiled_model, 
+											height, width), settings["domain"])
+		if snapshot_every and len(level["trail"]) % snapshot_every == 0:
+			on_snapshot(create_snapshot(level, settings, attempt, rng, model_key))
+
+	for attempt in range(first_attempt, settings["max_attempts"]):
+		if level is None:
+			level = initialize_level(lattice_height, lattice_width, 
+										compiled_model, settings["wrapping"])
+			rng = substream(settings["seed"], "attempt", attempt)
+
+		valid = solve_level(level, compiled_model, rng=rng, on_step=on_step)
+		
+		if not valid:
+			if verbose:
+				print(f"Contradiction reached during sampling. A position in the "+
+					f"level has 0 possible patterns. Generation attempt "+
+					f"{attempt} failed.")
+			level = None
+		else:
+			return finalize_level(level, compiled_model, height, width)
+
+	return None
+
+# The observe and propagate loop; repeatedly collapse one of the positions with 
+# the lowest entropy and propagate the result, until every position has been 
+# collapsed. Every observation is added to the level's trail, and 'on_step' 
+# (if given) is called with the level after it has been propagated. 
+# Returns False if a contradiction was reached.
+def solve_level(level, compiled_model, rng=random, on_step=None):
+	if not propagate(level, compiled_model):
+		return False
+	possible_positions = get_observable_positions(level)
+	
+	while len(possible_positions) > 0:
+		pos, pat = observe(level, compiled_model, possible_positions, rng)
+
+		collapse(level, compiled_model, pos, pat)
+		level["trail"].append((pos, pat))
+
+		if not propagate(level, compiled_model):
+			return False
+
+		if on_step is not None:
+			on_step(level)
+
+		possible_positions = get_observable_positions(level)
+
+	return True
+
+# A compact snapshot of a generation in progress, taken between observations.
+#	"settings" - the arguments the generation was started with, and its seed
+#	"attempt" - the generation attempt the snapshot was taken in
+#	"model" - the hash of the model (see wfc/cache.py), and 
+#	"num_patterns" - the number of patterns in the model, to check that the 
+#				snapshot is resumed with the same model
+#	"wave" - the patterns allowed at every position as a zlib compressed 
+#				bitset, bit position*num_patterns + pattern
+#	"rng_state" - the state of the random number generator
+#	"step" - the number of observations made so far
+#	"trail" - the observations made so far, as a flat array of (position, 
+#				pattern) pairs
+# The support counts are not stored since they can be rebuilt from the wave.
+def create_snapshot(level, settings, attempt, rng, model_key):
+	return {
+			"settings": dict(settings),
+			"attempt": attempt,
+			"model": model_key,
+			"num_patterns": level["num_patterns"],
+			"wave": zlib.compress(pack_bits(level["possible"])),
+			"rng_state": rng.getstate(),
+			"step": len(level["trail"]),
+			"trail": array.array("i", [value for observation in level["trail"] 
+												for value in observation])
+			}
+
+# Rebuild a level from a snapshot. Starting from a fresh level, the patterns 
+# that are not in the snapshot's wave are removed and propagated, which brings
+# the support counts to the same state they were in when the snapshot was taken
+def restore_level(snapshot, compiled_model):
+	settings = snapshot["settings"]
+	lattice_height = -(-settings["height"] // compiled_model["row_offset"])
+	lattice_width = -(-settings["width"] // compiled_model["col_offset"])
+
+	level = initialize_level(lattice_height, lattice_width, compiled_model, 
+														settings["wrapping"])
+
+	num_patterns = level["num_patterns"]
+	current = level["possible"]
+	possible = unpack_bits(zlib.decompress(snapshot["wave"]), len(current))
+	for index, allowed in enumerate(possible):
+		if not allowed and current[index]:
+			remove_pattern(level, compiled_model, index // num_patterns, 
+													index % num_patterns)
+
+	if not propagate(level, compiled_model):
+		raise ValueError("the snapshot's wave contains a contradiction")
+
+	trail = snapshot["trail"]
+	level["trail"] = [(trail[i], trail[i+1]) for i in range(0, len(trail), 2)]
+
+	return level
+
+# pack a bytearray of 0/1 flags into a bitset, 8 flags per byte
+def pack_bits(flags):
+	num_bytes = -(-len(flags) // 8)
+	packed = 0
+	for bit in range(8):
+		packed |= int.from_bytes(flags[bit::8], "little") << bit
+
+	return packed.to_bytes(num_bytes, "little")
+
+# unpack a bitset made by 'pack_bits' into a bytearray of num_flags 0/1 flags
+def unpack_bits(packed, num_flags):
+	value = int.from_bytes(packed, "little")
+	ones = int.from_bytes(b"\x01" * len(packed), "little")
+
+	flags = bytearray(num_flags)
+	for bit in range(8):
+		num_bit_flags = len(range(bit, num_flags, 8))
+		flags[bit::8] = ((value >> bit) & ones).to_bytes(len(packed), 
+												"little")[:num_bit_flags]
+
+	return flags
+
+def save_snapshot(snapshot, path):
+	import pickle
+
+	if os.path.dirname(path):
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+
+	# write to a temporary file first, so an interrupted write never 
+	# replaces a good snapshot with a broken one
+	temporary_path = f"{path}.tmp"
+	with open(temporary_path, "wb") as fp:
+		pickle.dump(snapshot, fp)
+	os.replace(temporary_path, path)
+
+def load_snapshot(path):
+	import pickle
+
+	with open(path, "rb") as fp:
+		return pickle.load(fp)
+
+# Convert a trained model into the index based form used during generation.
+# The patterns are referred to by their index in 'patterns', and the allowed
+# adjacencies are stored per direction in compressed sparse row form (see 
+# 'compute_adjacencies' in wfc/training.py). Models trained before the sparse
+# adjacencies were introduced are converted from their 'allowed_adjacencies'.
+# The compiled model is cached on the model, so it is only built once.
+def compile_model(model):
+	if "compiled" in model:
+		return model["compiled"]
+
+	pattern_occurrences = model["pattern_counts"]
+	if "patterns" in model:
+		patterns = list(model["patterns"])
+	else:
+		patterns = list(pattern_occurrences.keys())
+
+	if "sparse_adjacencies" in model:
+		adjacencies = [(model["sparse_adjacencies"][direction]["offsets"],
+						model["sparse_adjacencies"][direction]["indices"])
+											for direction in DIRECTIONS]
+	else:
+		pattern_indices = {pattern:index for index,pattern in enumerate(patterns)}
+		allowed_adjacencies = model["allowed_adjacencies"]
+		adjacencies = []
+		for direction in DIRECTIONS:
+			offsets = array.array("i", [0])
+			indices = array.array("i")
+			for pattern in patterns:
+				indices.extend(pattern_indices[pattern_to_tuple(p)] 
+								for p in allowed_adjacencies[pattern][direction])
+				offsets.append(len(indices))
+			adjacencies.append((offsets, indices))
+
+	weights = [pattern_occurrences[pattern] for pattern in patterns]
+
+	pattern_height = model["pattern_height"]
+	pattern_width = model["pattern_width"]
+	row_offset = model.get("row_offset", 1)
+	col_offset = model.get("col_offset", 1)
+	if not (0 < row_offset <= pattern_height and 0 < col_offset <= pattern_width):
+		raise ValueError("the row and column offsets must be between 1 and the "+
+			f"pattern size, but offsets of {row_offset}, {col_offset} were given "+
+			f"for {pattern_height}x{pattern_width} patterns.")
+
+	# the adjacencies expanded to one tuple per pattern, for fast iteration
+	# during propagation
+	adjacency_lists = [[tuple(indices[offsets[pattern]:offsets[pattern+1]]) 
+										for pattern in range(len(patterns))]
+										for offsets, indices in adjacencies]
+
+	compiled_model = {
+					"patterns": patterns,
+					"pattern_height": pattern_height,
+					"pattern_width": pattern_width,
+					"row_offset": row_offset,
+					"col_offset": col_offset,
+					"weights": weights,
+					"weight_logs": [weight*math.log(weight) if weight > 0 else 0.0
+														for weight in weights],
+					"adjacencies": adjacencies,
+					"adjacency_lists": adjacency_lists
+					}
+
+	model["compiled"] = compiled_model
+	return compiled_model
+
+# A copy of the compiled model which samples the patterns with other weights,
+# e.g., the weights of the patterns within a specific region type
+def with_weights(compiled_model, weights):
+	# the hash of a model (see wfc/cache.py) doesn't include the new weights
+	weighted_model = {key:value for key,value in compiled_model.items() 
+													if key != "hash"}
+	weighted_model["weights"] = weights
+	weighted_model["weight_logs"] = [weight*math.log(weight) if weight > 0 else 0.0
+														for weight in weights]
+	return weighted_model
+
+# The position of each position's neighbor in each direction (or -1 if there
+# is none) on a height X width lattice, at index position*4 + direction
+def get_lattice_neighbors(height, width, wrapping):
+	neighbors = array.array("i", [-1]) * (height*width*4)
+	for r in range(height):
+		for c in range(width):
+			for direction, (row_step, col_step) in enumerate(DIRECTION_STEPS):
+				neighbor_r = r + row_step
+				neighbor_c = c + col_step
+				if wrapping:
+					neighbor_r %= height
+					neighbor_c %= width
+				# if not wrapping, anything can be placed out of bounds
+				elif not (0 <= neighbor_r < height and 0 <= neighbor_c < width):
+					continue
+				neighbors[(r*width + c)*4 + direction] = \
+												neighbor_r*width + neighbor_c
+
+	return neighbors
+
+def initialize_level(height, width, compiled_model, wrapping):
+	level = initialize_wave(get_lattice_neighbors(height, width, wrapping), 
+															compiled_model)
+	level["height"] = height
+	level["width"] = width
+
+	return level
+
+# The level being generated (the 'wave') is stored in flat arrays indexed by 
+# position (row*width + col for a lattice), so that memory stays at a few 
+# bytes per (position, pattern) pair even for large patterns
+#	"possible" - 1 if a pattern is still allowed at a position, else 0, at 
+#				index position*num_patterns + pattern
+#	"support" - for every direction, position and pattern, the number of 
+#				patterns still allowed at the neighbor in that direction which
+#				can be placed next to the pattern, at index 
+#				[direction][position*num_patterns + pattern]
+#	"counts", "sum_weights", "sum_weight_logs" - per position totals of the 
+#				allowed patterns, used to compute the entropy of a position
+#	"neighbors" - the position of the neighbor in each direction (or -1 if 
+#				there is none), at index position*4 + direction
+#	"removed" - the (position, pattern) pairs that still need to be propagated
+#	"trail" - the (position, pattern) observations made so far
+#
+# The positions don't need to form a full lattice, any neighbor table (see
+# 'get_lattice_neighbors') can be used. Patterns with a weight of 0 (e.g., the
+# patterns of an ensemble that the chosen models don't have, see 
+# wfc/ensemble.py) are left out of the wave from the start.
+def initialize_wave(neighbors, compiled_model):
+	weights = compiled_model["weights"]
+	adjacencies = compiled_model["adjacencies"]
+	num_patterns = len(weights)
+	num_positions = len(neighbors) // 4
+
+	allowed = bytearray(1 if weight > 0 else 0 for weight in weights)
+
+	# initially every pattern is supported by all the allowed patterns it can 
+	# be placed next to. The support of the patterns that aren't allowed is 
+	# never used, but is still decremented by 'propagate', so it starts at the
+	# number of patterns they can be placed next to.
+	typecode = "H" if num_patterns < 2**16 else "I"
+	initial_support = [[offsets[pattern+1] - offsets[pattern] 
+										for pattern in range(num_patterns)]
+										for offsets, indices in adjacencies]
+	if not all(allowed):
+		initial_support = [[sum(allowed[other] for other in 
+								indices[offsets[pattern]:offsets[pattern+1]])
+								if allowed[pattern] else direction_support[pattern]
+										for pattern in range(num_patterns)]
+							for (offsets, indices), direction_support 
+										in zip(adjacencies, initial_support)]
+	support = [array.array(typecode, direction_support) * num_positions 
+								for direction_support in initial_support]
+
+	level = {
+			"num_patterns": num_patterns,
+			"possible": allowed * num_positions,
+			"support": support,
+			"counts": [sum(allowed)] * num_positions,
+			"sum_weights": [sum(weights)] * num_positions,
+			"sum_weight_logs": [sum(compiled_model["weight_logs"])] * num_positions,
+			"neighbors": neighbors,
+			"removed": [],
+			"trail": []
+			}
+
+	# patterns that can't be placed next to anything in some direction are 
+	# only allowed at positions without a neighbor in that direction
+	unsupported = [(pattern, direction) for pattern in range(num_patterns) 
+										for direction in range(4) 
+										if allowed[pattern] and 
+											initial_support[direction][pattern] == 0]
+	for pattern, direction in unsupported:
+		for position in range(num_positions):
+			if neighbors[position*4 + direction] >= 0 and \
+							level["possible"][position*num_patterns + pattern]:
+				remove_pattern(level, compiled_model, position, pattern)
+
+	return level
+
+# remove a pattern from the patterns allowed at a position, the removal is
+# then passed on to the neighbors of the position by 'propagate'
+def remove_pattern(level, compiled_model, position, pattern):
+	level["possible"][position*level["num_patterns"] + pattern] = 0
+	level["counts"][position] -= 1
+	level["sum_weights"][position] -= compiled_model["weights"][pattern]
+	level["sum_weight_logs"][position] -= compiled_model["weight_logs"][pattern]
+	level["removed"].append((position, pattern))
+
+# get the patterns still allowed at a position
+def get_patterns_at_position(level, position):
+	num_patterns = level["num_patterns"]
+	start = position*num_patterns
+	possible = level["possible"]
+	return [pattern for pattern in range(num_patterns) 
+											if possible[start + pattern]]
+
+# get the pattern at a position that has been collapsed to a single pattern
+def get_collapsed_pattern(level, position):
+	start = position*level["num_patterns"]
+	return level["possible"].index(1, start, start + level["num_patterns"]) - start
+
+# check if there are any positions with 0 options available
+def is_valid_level(level):
+	return min(level["counts"]) > 0
+
+def get_observable_positions(level):
+	# gather the positions with the fewest available options
+	lowest_entropy = float("inf")
+	possible_positions = []
+	counts = level["counts"]
+	sum_weights = level["sum_weights"]
+	sum_weight_logs = level["sum_weight_logs"]
+	for position in range(len(counts)):
+
+		# either a fail state (no options), or a collapsed state (1 option)
+		if counts[position] <= 1:
+			if counts[position] == 0:
+				print("Ran into a fail case; no options available for a "+
+					"position. Restarting generation.")
+				return []
+			else:
+				# not a fail state, this position is just already collapsed
+				continue
+
+		entropy = compute_shannon_entropy(sum_weights[position], 
+											sum_weight_logs[position])
+
+		# new lowest entropy position found, overwrite possible positions
+		if entropy < lowest_entropy - ENTROPY_TOLERANCE:
+			lowest_entropy = entropy
+			possible_positions = [position]
+
+		# position with the same as current lowest entropy,
+		# append to possible positions
+		elif entropy <= lowest_entropy + ENTROPY_TOLERANCE:
+			possible_positions.append(position)
+		
+		# entropy is higher than current lowest entropy, skip position
+		else:
+			continue
+
+	return possible_positions
+
+def observe(level, compiled_model, possible_positions, rng=random):
+	# randomly choose which position to collapse
+	position = rng.choice(possible_positions)
+	
+	# get the possible patterns at the chosen position
+	possible_patterns_at_position = get_patterns_at_position(level, position)
+
+	# construct a weighted choice for those patters based on occurrences
+	weights = [compiled_model["weights"][pattern] 
+								for pattern in possible_patterns_at_position]
+
+	total_weight = sum(weights)
+	weights=[weight/total_weight for weight in weights]
+
+	chosen_pattern = rng.choices(possible_patterns_at_position, 
+									weights=weights, 
+									k=1)[0]
+
+	return position, chosen_pattern
+
+# collapse a position to the chosen pattern, by removing all other patterns
+def collapse(level, compiled_model, position, chosen_pattern):
+	for pattern in get_patterns_at_position(level, position):
+		if pattern != chosen_pattern:
+			remove_pattern(level, compiled_model, position, pattern)
+
+# The Shannon entropy of the patterns allowed at a position, computed from the
+# sum of their weights w and the sum of w*log(w), since 
+#	-sum(w/W * log(w/W)) = log(W) - sum(w*log(w))/W
+def compute_shannon_entropy(sum_weights, sum_weight_logs):
+	return math.log(sum_weights) - sum_weight_logs/sum_weights
+
+# Propagate the removed patterns through the level using support counting.
+# When a pattern is removed from a position, every pattern it supported at a
+# neighboring position loses one supporting pattern in that direction. Once a 
+# pattern has no support left in some direction, it can't be placed at that 
+# position anymore, and is removed (and propagated) in turn. This only visits 
+# the sparse adjacency lists of the patterns that were actually removed.
+# Returns False if a position ran out of patterns (a contradiction).
+def propagate(level, compiled_model):
+	num_patterns = level["num_patterns"]
+	possible = level["possible"]
+	support = level["support"]
+	counts = level["counts"]
+	sum_weights = level["sum_weights"]
+	sum_weight_logs = level["sum_weight_logs"]
+	neighbors = level["neighbors"]
+	removed = level["removed"]
+	weights = compiled_model["weights"]
+	weight_logs = compiled_model["weight_logs"]
+	adjacency_lists = compiled_model["adjacency_lists"]
+
+	while len(removed) > 0:
+		position, pattern = removed.pop()
+		if counts[position] == 0:
+			del removed[:]
+			return False
+
+		for direction in range(4):
+			neighbor = neighbors[position*4 + direction]
+			if neighbor < 0:
+				continue
+
+			# the neighbor's patterns are supported from the opposite direction
+			neighbor_support = support[direction ^ 1]
+			neighbor_start = neighbor*num_patterns
+			for neighbor_pattern in adjacency_lists[direction][pattern]:
+				index = neighbor_start + neighbor_pattern
+				neighbor_support[index] -= 1
+				if neighbor_support[index] == 0 and possible[index]:
+					# same as 'remove_pattern', inlined as this is the 
+					# innermost loop of the generator
+					possible[index] = 0
+					counts[neighbor] -= 1
+					sum_weights[neighbor] -= weights[neighbor_pattern]
+					sum_weight_logs[neighbor] -= weight_logs[neighbor_pattern]
+					removed.append((neighbor, neighbor_pattern))
+
+	return True
+
+# The tiles covered by each position of the lattice are the top left 
+# row_offset X col_offset block of the pattern at that position. The expanded 
+# lattice is cropped to height X width tiles. 'lattice_patterns' holds the 
+# pattern index at every position (row*lattice_width + col), or None for the
+# positions that have not collapsed yet, in which case 'fill' is called with 
+# the position to get the value used for all the tiles in its block.
+def expand_lattice(lattice_patterns, lattice_width, compiled_model, height, width,
+												fill=lambda position: None):
+	patterns = compiled_model["patterns"]
+	pattern_width = compiled_model["pattern_width"]
+	row_offset = compiled_model["row_offset"]
+	col_offset = compiled_model["col_offset"]
+
+	expanded_level = [[None for c in range(width)] for r in range(height)]
+	for position, pattern_index in enumerate(lattice_patterns):
+		lattice_r, lattice_c = divmod(position, lattice_width)
+		if pattern_index is not None:
+			pattern = patterns[pattern_index]
+		else:
+			pattern = None
+			value = fill(position)
+
+		for block_r in range(row_offset):
+			r = lattice_r*row_offset + block_r
+			if r >= height:
+				break
+			for block_c in range(col_offset):
+				c = lattice_c*col_offset + block_c
+				if c >= width:
+					break
+				if pattern is not None:
+					value = pattern[block_r*pattern_width + block_c]
+				expanded_level[r][c] = value
+
+	return expanded_level
+
+# The pattern index at every collapsed position of the level, and None at the 
+# other positions
+def get_lattice_patterns(level):
+	return [get_collapsed_pattern(level, position) if count == 1 else None 
+							for position, count in enumerate(level["counts"])]
+
+# The tiles of the generated level
+def finalize_level(level, compiled_model, height, width):
+	return expand_lattice(get_lattice_patterns(level), level["width"], 
+											compiled_model, height, width)
+
+# The level as it is being generated; the tiles of each collapsed position, 
+# and the number of patterns still allowed at every other position
+def get_level_in_progress(level, compiled_model, height, width):
+	counts = level["counts"]
+	return expand_lattice(get_lattice_patterns(level), level["width"], 
+							compiled_model, height, width, 
+							fill=lambda position: counts[position])
@@ -0,0 +1,392 @@
+import array
+import multiprocessing
+
+from wfc.generation import compile_model, with_weights, generate_new_level, \
+		get_lattice_neighbors, initialize_wave, remove_pattern, solve_level, \
+		collapse, get_collapsed_pattern, expand_lattice, check_level_size
+from wfc.seeding import make_seed, derive_seed, substream
+
+
+# Hierarchical generation for large levels. Rather than running a single wave
+# over the whole level, the level is generated in three steps
+#	1. A coarse grid of region types is generated with the region model that
+#		was trained on downsampled examples (see 'train_region_model' in
+#		wfc/training.py)
+#	2. The seams, the lattice rows and columns on the borders between the
+#		regions, are generated with the tile level model
+#	3. The inside of every region is generated with the tile level model,
+#		with the seams around it fixed. The patterns are weighted by how often
+#		they occur in the region's type. Since the regions only share the seams,
+#		they are generated independently, and in parallel.
+# So the time spent in step 3 scales with the number of regions over the number
+# of processes, and a contradiction inside a region only restarts that region.
+# Regions which can't be completed with their seams fixed are regenerated 
+# along with their seams afterwards, and if needed along with a growing area 
+# of their neighbors (see 'repair_region'). Only if that fails too, or if the
+# region types or seams can't be generated, is the whole level started over.
+# Steps 1 and 2 and the repairs run in this process, one after another. The 
+# seams are about 1/region_rows + 1/region_cols of the lattice (e.g., almost
+# half of it with regions of 4x4 positions), so the regions have to be large,
+# and there have to be several processes, for this to be faster than making
+# the level with 'generate_new_level'; with small regions, or a single 
+# process, it is slower.
+# Every step, attempt and region samples from its own stream of the seed drawn
+# from 'rng' (see wfc/seeding.py), so the level doesn't depend on the number 
+# of processes or the order the regions are finished in. As with 
+# 'generate_new_level', a cache (see wfc/cache.py) is used if one is given
+# along with 'rng'.
+# The regions are generated by a pool of 'processes' worker processes, which
+# is created for every level unless a pool made with 'create_region_pool' is
+# given, so a batch of levels can share one pool.
+
+# Patterns that were never seen in a region type are still allowed in it, with
+# this fraction of the pattern's overall weight
+UNSEEN_PATTERN_WEIGHT = 0.01
+
+def generate_hierarchical_level(height, width, model, wrapping=False,
+								max_attempts=5, processes=None, rng=None, cache=None,
+								pool=None):
+	if "regions" not in model:
+		raise ValueError("hierarchical generation needs a model trained with "+
+			"regions (see the 'region_height' argument of WFC_train.py)")
+	seed = make_seed(rng)
+
+	if cache is not None and rng is not None:
+		from wfc.cache import hash_key, model_hash
+		key = hash_key("hierarchical level", model_hash(model), height, width,
+											wrapping, max_attempts, seed)
+		return cache.get_or_compute(key, lambda: generate_hierarchical_level(
+									height, width, model, wrapping=wrapping, 
+									max_attempts=max_attempts, 
+									processes=processes, rng=seed, pool=pool))
+
+	compiled_model = compile_model(model)
+	check_level_size(height, width, compiled_model, wrapping)
+	regions = model["regions"]
+
+	lattice_height = -(-height // compiled_model["row_offset"])
+	lattice_width = -(-width // compiled_model["col_offset"])
+
+	# the size of the regions in lattice positions
+	region_rows = max(1, regions["region_height"] // compiled_model["row_offset"])
+	region_cols = max(1, regions["region_width"] // compiled_model["col_offset"])
+
+	grid_height = -(-lattice_height // region_rows)
+	grid_width = -(-lattice_width // region_cols)
+
+	lattice_neighbors = get_lattice_neighbors(lattice_height, lattice_width, 
+																	wrapping)
+
+	# the region models are also needed in this process to repair regions
+	region_models = get_region_models(model)
+	owns_pool = pool is None and processes != 1
+	if owns_pool:
+		pool = create_region_pool([model], processes)
+	if pool is not None:
+		from wfc.cache import model_hash
+		model_key = model_hash(model)
+	else:
+		model_key = None
+
+	try:
+		for attempt in range(max_attempts):
+			region_types = generate_new_level(grid_height, grid_width,
+								regions["model"], wrapping=wrapping,
+								max_attempts=max_attempts, verbose=False, 
+								rng=derive_seed(seed, "regions", attempt))
+			if region_types is None:
+				continue
+
+			seam_patterns = generate_seams(lattice_height, lattice_width,
+								region_rows, region_cols, lattice_neighbors, 
+								compiled_model, max_attempts, 
+								derive_seed(seed, "seams", attempt))
+			if seam_patterns is None:
+				continue
+
+			lattice_patterns = fill_regions(region_types, seam_patterns,
+								lattice_height, lattice_width, region_rows,
+								region_cols, wrapping, lattice_neighbors, 
+								max_attempts, derive_seed(seed, "fill", attempt), 
+								region_models, pool, model_key)
+			if lattice_patterns is None:
+				continue
+
+			return expand_lattice(lattice_patterns, lattice_width,
+											compiled_model, height, width)
+	finally:
+		if owns_pool:
+			pool.close()
+			pool.join()
+
+	return None
+
+# The tile level model of each region type, by region type, where None is the
+# tile level model itself
+def get_region_models(model):
+	compiled_model = compile_model(model)
+	region_weights = get_region_weights(model["regions"], compiled_model)
+
+	region_models = {None: compiled_model}
+	for region_type, weights in region_weights.items():
+		region_models[region_type] = with_weights(compiled_model, weights)
+
+	return region_models
+
+# The weights of the tile level model's patterns within each region type
+def get_region_weights(regions, compiled_model):
+	region_weights = {}
+	for region_type, pattern_counts in regions["pattern_counts"].items():
+		region_weights[region_type] = [
+				pattern_counts.get(pattern, weight*UNSEEN_PATTERN_WEIGHT)
+				for pattern, weight in zip(compiled_model["patterns"],
+												compiled_model["weights"])]
+
+	return region_weights
+
+# a position is on a seam if it is on the border of a region
+def is_seam(r, c, region_rows, region_cols):
+	return r % region_rows == 0 or c % region_cols == 0
+
+# The neighbor table (see 'get_lattice_neighbors') of a subset of the lattice
+# positions, where the neighbors of a position are its lattice neighbors that
+# are also in the subset. The positions of the subset are indexed by their 
+# order in 'positions'.
+def get_subset_neighbors(positions, lattice_neighbors):
+	indices = {position:index for index,position in enumerate(positions)}
+	neighbors = array.array("i", [-1]) * (len(positions)*4)
+	for index, position in enumerate(positions):
+		for direction in range(4):
+			neighbor = lattice_neighbors[position*4 + direction]
+			if neighbor in indices:
+				neighbors[index*4 + direction] = indices[neighbor]
+
+	return neighbors
+
+# Generate the patterns on the seams between the regions. The seam positions
+# are generated as a single wave, where the neighbors of a position are its
+# neighbors on the seams. Returns a dict of lattice position -> pattern index,
+# or None if every attempt ran into a contradiction.
+def generate_seams(lattice_height, lattice_width, region_rows, region_cols,
+						lattice_neighbors, compiled_model, max_attempts, seed):
+	seam_positions = [r*lattice_width + c for r in range(lattice_height)
+								for c in range(lattice_width)
+								if is_seam(r, c, region_rows, region_cols)]
+	neighbors = get_subset_neighbors(seam_positions, lattice_neighbors)
+
+	# the directions in which a seam position has a neighbor inside a region
+	region_directions = [(index, direction) 
+							for index, position in enumerate(seam_positions)
+							for direction in range(4)
+							if neighbors[index*4 + direction] < 0 and 
+								lattice_neighbors[position*4 + direction] >= 0]
+
+	adjacencies = compiled_model["adjacencies"]
+	num_patterns = len(compiled_model["patterns"])
+	for attempt in range(max_attempts):
+		level = initialize_wave(neighbors, compiled_model)
+
+		# patterns that can't be placed next to anything in the direction of a
+		# region can't be placed on the seam
+		for index, direction in region_directions:
+			offsets, indices = adjacencies[direction]
+			for pattern in range(num_patterns):
+				if offsets[pattern] == offsets[pattern+1] and \
+							level["possible"][index*num_patterns + pattern]:
+					remove_pattern(level, compiled_model, index, pattern)
+
+		if solve_level(level, compiled_model, rng=substream(seed, attempt)):
+			return {position: get_collapsed_pattern(level, index)
+								for index, position in enumerate(seam_positions)}
+
+	return None
+
+# The lattice rows (or columns) of the region with the given index; the rows
+# inside it, and the seam row on its far border
+def get_region_span(index, region_size, lattice_size, wrapping):
+	start = index*region_size
+	end = min(start + region_size, lattice_size)
+	span = list(range(start, end))
+
+	border = end % lattice_size if wrapping else end
+	if border < lattice_size and border not in span:
+		span.append(border)
+
+	return span
+
+# Generate the inside of every region, with the seams around it fixed. The
+# regions are generated in parallel if a pool of worker processes is given,
+# where the workers look the region models up by 'model_key'.
+# Regions that can't be generated with their seams fixed are then repaired 
+# one by one (see 'repair_region'). Returns the pattern index at every 
+# lattice position, or None if a region couldn't be generated.
+def fill_regions(region_types, seam_patterns, lattice_height, lattice_width,
+						region_rows, region_cols, wrapping, lattice_neighbors, 
+						max_attempts, seed, region_models, pool, model_key):
+	tasks = []
+	region_positions = []
+	for grid_r, row in enumerate(region_types):
+		rows = get_region_span(grid_r, region_rows, lattice_height, wrapping)
+		for grid_c, region_type in enumerate(row):
+			cols = get_region_span(grid_c, region_cols, lattice_width, wrapping)
+
+			positions = [r*lattice_width + c for r in rows for c in cols]
+			fixed_patterns = [(index, seam_patterns[position])
+									for index, position in enumerate(positions)
+									if position in seam_patterns]
+
+			# every region samples with its own random stream, so the worker
+			# processes don't all make the same choices
+			tasks.append((get_subset_neighbors(positions, lattice_neighbors), 
+								fixed_patterns, region_type, 
+								derive_seed(seed, "region", len(tasks)), 
+								max_attempts))
+			region_positions.append((positions, region_type))
+
+	if pool is None:
+		results = (fill_region(task, region_models) for task in tasks)
+	else:
+		results = pool.map(fill_region_in_worker, 
+									[(model_key,) + task for task in tasks])
+
+	lattice_patterns = [None] * (lattice_height*lattice_width)
+	for position, pattern in seam_patterns.items():
+		lattice_patterns[position] = pattern
+
+	failed_regions = []
+	for index, ((positions, region_type), patterns) in \
+							enumerate(zip(region_positions, results)):
+		if patterns is None:
+			failed_regions.append((positions, region_type, 
+										derive_seed(seed, "repair", index)))
+			continue
+		for position, pattern in zip(positions, patterns):
+			lattice_patterns[position] = pattern
+
+	for positions, region_type, repair_seed in failed_regions:
+		if not repair_region(positions, region_type, lattice_patterns, 
+					seam_patterns, lattice_neighbors, max_attempts, repair_seed,
+					region_models, max(region_rows, region_cols)):
+			return None
+
+	return lattice_patterns
+
+# Regenerate a region that couldn't be generated with its seams fixed. This 
+# time the region's own seams are generated along with its inside, and the 
+# already generated positions just outside of the region are fixed instead, 
+# so the seams are chosen to fit both the region and its neighbors.
+# If that fails too, the positions around the region are regenerated along 
+# with it, growing the area by 1, 2, 4, ... positions on every side up to
+# 'max_growth', so a contradiction only regenerates the part of the level 
+# around it. Returns False if even the largest area couldn't be generated.
+def repair_region(positions, region_type, lattice_patterns, seam_patterns,
+							lattice_neighbors, max_attempts, seed, region_models,
+							max_growth):
+	growth = 0
+	area = positions
+	while not regenerate_area(area, region_type, lattice_patterns, 
+								seam_patterns, lattice_neighbors, max_attempts, 
+								derive_seed(seed, growth), region_models):
+		if growth >= max_growth:
+			return False
+		next_growth = min(max(1, growth*2), max_growth)
+		area = grow_area(area, lattice_neighbors, next_growth - growth)
+		growth = next_growth
+
+	return True
+
+# the area with the positions up to 'steps' lattice positions around it
+def grow_area(area, lattice_neighbors, steps):
+	area = list(area)
+	in_area = set(area)
+	border = area
+	for step in range(steps):
+		new_border = []
+		for position in border:
+			for direction in range(4):
+				neighbor = lattice_neighbors[position*4 + direction]
+				if neighbor >= 0 and neighbor not in in_area:
+					in_area.add(neighbor)
+					new_border.append(neighbor)
+		area.extend(new_border)
+		border = new_border
+
+	return area
+
+# Generate the positions of an area with the already generated positions 
+# around it fixed, see 'repair_region'. Returns False if every attempt failed.
+def regenerate_area(positions, region_type, lattice_patterns, seam_patterns,
+							lattice_neighbors, max_attempts, seed, region_models):
+	region = set(positions)
+	ring = []
+	for position in positions:
+		for direction in range(4):
+			neighbor = lattice_neighbors[position*4 + direction]
+			if neighbor >= 0 and neighbor not in region and \
+							neighbor not in ring and \
+							lattice_patterns[neighbor] is not None:
+				ring.append(neighbor)
+
+	repair_positions = positions + ring
+	fixed_patterns = [(len(positions) + index, lattice_patterns[position])
+									for index, position in enumerate(ring)]
+
+	patterns = fill_region((get_subset_neighbors(repair_positions, 
+									lattice_neighbors), fixed_patterns, 
+									region_type, seed, max_attempts), region_models)
+	if patterns is None:
+		return False
+
+	for position, pattern in zip(positions, patterns):
+		lattice_patterns[position] = pattern
+		if position in seam_patterns:
+			seam_patterns[position] = pattern
+
+	return True
+
+
+# A pool of worker processes that can generate the regions of levels of any of
+# the models (see 'generate_hierarchical_level'). The region models are sent
+# to every worker once, when the pool is created. Any pool (or executor) with 
+# a 'map' method can be used, if its workers are set up with 
+# 'initialize_region_worker'.
+def create_region_pool(models, processes=None):
+	from wfc.cache import model_hash
+
+	models_region_models = {model_hash(model): get_region_models(model)
+													for model in models}
+	return multiprocessing.Pool(processes, initializer=initialize_region_worker,
+									initargs=(models_region_models,))
+
+# The region models of every model the worker process generates regions for,
+# by model hash (see wfc/cache.py). Only used in the worker processes.
+worker_region_models = {}
+
+def initialize_region_worker(models_region_models):
+	worker_region_models.update(models_region_models)
+
+def fill_region_in_worker(task):
+	model_key = task[0]
+	if model_key not in worker_region_models:
+		raise ValueError("the pool was not created for the model being "+
+				"generated, see 'create_region_pool' in wfc/hierarchical.py")
+	return fill_region(task[1:], worker_region_models[model_key])
+
+# Generate the positions of a region, where 'neighbors' is the neighbor table 
+# of the region's positions and 'fixed_patterns' the (position, pattern index)
+# pairs that are already known. Returns the pattern index at every position 
+# of the region, or None if every attempt failed.
+def fill_region(task, region_models):
+	neighbors, fixed_patterns, region_type, seed, max_attempts = task
+
+	compiled_model = region_models.get(region_type, region_models[None])
+	for attempt in range(max_attempts):
+		level = initialize_wave(neighbors, compiled_model)
+		for position, pattern in fixed_patterns:
+			collapse(level, compiled_model, position, pattern)
+
+		if solve_level(level, compiled_model, rng=substream(seed, attempt)):
+			return [get_collapsed_pattern(level, position)
+								for position in range(len(neighbors) // 4)]
+
+	return None
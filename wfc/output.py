@@ -0,0 +1,255 @@
+import os
+import io
+import json
+import gzip
+import array
+
+
+# Output sinks used to store generated levels. Every sink has the same small
+# interface (write_level, write_image and close) and can be used as a context
+# manager, so the generation loop does not need to know how (or where) the
+# levels end up being stored. Levels are lists of rows of single character
+# tiles, as returned by 'generate_new_level'.
+#
+# The available formats are:
+#	"txt"    - one .txt file (and optionally one .jpeg) per level in a folder
+#	"ndjson" - every level is one JSON object per line of a single file
+#	"tar"    - every level is a .txt member of a single tar archive
+#	"zip"    - every level is a .txt member of a single zip archive
+#	"packed" - all levels as one uint8 array file, plus a JSON index file
+OUTPUT_FORMATS = ["txt", "ndjson", "tar", "zip", "packed"]
+
+# The formats whose levels are rendered as images by default. The images of
+# the other single file formats would be written as one file per level next 
+# to the output, so they are only rendered when asked for.
+IMAGE_FORMATS = ["txt", "tar", "zip"]
+
+# writes to the underlying files are buffered in chunks of this many bytes
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+# convert a level (a list of rows of tiles) to its text representation, one
+# row per line, which is the same layout as the training data files
+def level_to_text(level):
+	return "".join("".join(row) + "\n" for row in level)
+
+# encode a rendered level image as JPEG bytes, so that it can be stored
+# anywhere a file can be
+def image_to_jpeg_bytes(image):
+	image_bytes = io.BytesIO()
+	image.save(image_bytes, "JPEG")
+	return image_bytes.getvalue()
+
+# create the folder that will hold the given file if it doesn't exist yet
+def make_parent_dirs(path):
+	parent = os.path.dirname(path)
+	if parent:
+		os.makedirs(parent, exist_ok=True)
+
+
+class LevelSink:
+	# path is where the output is written, images (if written) are stored
+	# in the folder that contains the output
+	def __init__(self, path):
+		self.path = path
+		self.image_dir = os.path.dirname(path) or "."
+
+	def write_level(self, name, level):
+		raise NotImplementedError
+
+	def write_image(self, name, image):
+		os.makedirs(self.image_dir, exist_ok=True)
+		image.save(os.path.join(self.image_dir, f"{name}_viz.jpeg"), "JPEG")
+
+	def close(self):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
+
+
+# The original output layout; a folder of <name>.txt and <name>_viz.jpeg files
+class TextDirectorySink(LevelSink):
+	def __init__(self, path, compress=False):
+		super().__init__(path)
+		self.image_dir = path
+		self.compress = compress
+		os.makedirs(path, exist_ok=True)
+
+	def write_level(self, name, level):
+		data = level_to_text(level).encode()
+		if self.compress:
+			with gzip.open(os.path.join(self.path, f"{name}.txt.gz"), "wb") as fp:
+				fp.write(data)
+		else:
+			with open(os.path.join(self.path, f"{name}.txt"), "wb") as fp:
+				fp.write(data)
+
+
+# One JSON object per line: {"name": <name>, "level": [<row>, <row>, ...]}
+# where every row is a string. Compressed files are gzip'ed.
+class NDJSONSink(LevelSink):
+	def __init__(self, path, compress=False, buffer_size=DEFAULT_BUFFER_SIZE):
+		super().__init__(path)
+		make_parent_dirs(path)
+		self.raw_file = open(path, "wb")
+		if compress:
+			self.fp = gzip.GzipFile(fileobj=self.raw_file, mode="wb")
+		else:
+			self.fp = self.raw_file
+		self.buffer = io.BufferedWriter(self.fp, buffer_size=buffer_size)
+
+	def write_level(self, name, level):
+		record = {"name": name, "level": ["".join(row) for row in level]}
+		self.buffer.write((json.dumps(record) + "\n").encode())
+
+	def close(self):
+		self.buffer.flush()
+		if self.fp is not self.raw_file:
+			self.fp.close()
+		self.raw_file.close()
+
+
+# Every level is stored as a <name>.txt member of a single tar or zip archive.
+# Rendered images are stored in the same archive as <name>_viz.jpeg members.
+# Compressed tar archives are gzip'ed, compressed zip archives are deflated.
+class ArchiveSink(LevelSink):
+	def __init__(self, path, archive_format="tar", compress=False,
+										buffer_size=DEFAULT_BUFFER_SIZE):
+		# the archive modules are only imported when an archive is written
+		import tarfile
+		import zipfile
+
+		super().__init__(path)
+		make_parent_dirs(path)
+		self.archive_format = archive_format
+		self.raw_file = open(path, "wb", buffering=buffer_size)
+
+		if archive_format == "tar":
+			mode = "w|gz" if compress else "w|"
+			self.archive = tarfile.open(fileobj=self.raw_file, mode=mode)
+		elif archive_format == "zip":
+			compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+			self.archive = zipfile.ZipFile(self.raw_file, "w",
+													compression=compression)
+		else:
+			raise ValueError(f"'archive_format' must take a value from " +
+								f"['tar', 'zip'], but {archive_format} was given.")
+
+	def add_member(self, member_name, data):
+		if self.archive_format == "tar":
+			info = self.archive.tarinfo(member_name)
+			info.size = len(data)
+			self.archive.addfile(info, io.BytesIO(data))
+		else:
+			self.archive.writestr(member_name, data)
+
+	def write_level(self, name, level):
+		self.add_member(f"{name}.txt", level_to_text(level).encode())
+
+	def write_image(self, name, image):
+		self.add_member(f"{name}_viz.jpeg", image_to_jpeg_bytes(image))
+
+	def close(self):
+		self.archive.close()
+		self.raw_file.close()
+
+
+# All levels are stored back to back as a flat array of uint8 tile codes in
+# <path>, with the levels row-major. The index is written to <path>.index.json
+# when the sink is closed, and holds the tile alphabet (code -> tile) as well
+# as the name, byte offset, height and width of every level. The offsets are
+# positions in the uncompressed array, compressed files are gzip'ed.
+class PackedArraySink(LevelSink):
+	def __init__(self, path, compress=False, buffer_size=DEFAULT_BUFFER_SIZE):
+		super().__init__(path)
+		make_parent_dirs(path)
+		self.compress = compress
+		self.raw_file = open(path, "wb")
+		if compress:
+			self.fp = gzip.GzipFile(fileobj=self.raw_file, mode="wb")
+		else:
+			self.fp = self.raw_file
+		self.buffer = io.BufferedWriter(self.fp, buffer_size=buffer_size)
+
+		self.tile_codes = {}
+		self.entries = []
+		self.offset = 0
+
+	def write_level(self, name, level):
+		codes = array.array("B")
+		for row in level:
+			for tile in row:
+				if tile not in self.tile_codes:
+					if len(self.tile_codes) > 255:
+						raise ValueError("the packed format supports at most " +
+											"256 different tiles")
+					self.tile_codes[tile] = len(self.tile_codes)
+				codes.append(self.tile_codes[tile])
+
+		self.buffer.write(codes.tobytes())
+		self.entries.append({"name": name, "offset": self.offset,
+								"height": len(level), "width": len(level[0])})
+		self.offset += len(codes)
+
+	def close(self):
+		self.buffer.flush()
+		if self.fp is not self.raw_file:
+			self.fp.close()
+		self.raw_file.close()
+
+		tiles = [None] * len(self.tile_codes)
+		for tile, code in self.tile_codes.items():
+			tiles[code] = tile
+
+		index = {"compressed": self.compress, "tiles": tiles,
+															"levels": self.entries}
+		with open(f"{self.path}.index.json", "w") as fp:
+			json.dump(index, fp)
+
+
+# read back the levels written by a PackedArraySink, yields (name, level) pairs
+def read_packed_levels(path):
+	with open(f"{path}.index.json") as fp:
+		index = json.load(fp)
+
+	opener = gzip.open if index["compressed"] else open
+	with opener(path, "rb") as fp:
+		data = fp.read()
+
+	tiles = index["tiles"]
+	for entry in index["levels"]:
+		height = entry["height"]
+		width = entry["width"]
+		start = entry["offset"]
+		level = [[tiles[code] for code in data[start+r*width:start+(r+1)*width]]
+														for r in range(height)]
+		yield entry["name"], level
+
+
+# the file extension used for each of the single file output formats
+def default_extension(output_format, compress=False):
+	extension = {"ndjson": "jsonl", "tar": "tar", "zip": "zip",
+											"packed": "u8"}[output_format]
+	if compress and output_format in ["ndjson", "tar", "packed"]:
+		extension += ".gz"
+	return extension
+
+# build the sink for the given output format
+def open_sink(output_format, path, compress=False,
+										buffer_size=DEFAULT_BUFFER_SIZE):
+	if output_format == "txt":
+		return TextDirectorySink(path, compress=compress)
+	elif output_format == "ndjson":
+		return NDJSONSink(path, compress=compress, buffer_size=buffer_size)
+	elif output_format in ["tar", "zip"]:
+		return ArchiveSink(path, archive_format=output_format,
+							compress=compress, buffer_size=buffer_size)
+	elif output_format == "packed":
+		return PackedArraySink(path, compress=compress, buffer_size=buffer_size)
+	else:
+		raise ValueError(f"'output_format' must take a value from " +
+							f"{OUTPUT_FORMATS}, but {output_format} was given.")
@@ -0,0 +1,7 @@
+# used to convert the pattern 2d lists to tuples to make dict usage 
+# and comparisons between patterns easier
+def pattern_to_tuple(pattern):
+	flattened_pattern = [tile for row in pattern for tile in row]
+	pattern_as_tuple = tuple(flattened_pattern)
+
+	return pattern_as_tuple
@@ -0,0 +1,58 @@
+import glob
+
+from PIL import Image
+
+
+# Visualize a Generated Level
+# Returns the rendered image, which can then be written to any output sink
+def render_level(level, sprite_mapping, sprites, background_color, domain):
+	
+	level_height = len(level)
+	level_width = len(level[0])
+
+	# sprites are max 18x18 pixels
+	viz_height =  18*level_height
+	viz_width =  18*level_width
+
+	# this creates the image for the level
+	image = Image.new("RGB", (viz_width, viz_height), color=background_color)
+	pixels = image.load()#this loads the level image's pixels so we can edit them
+
+
+	for y in range(0, level_height):
+		for x in range(0, level_width):
+			imageToUse = None
+			if level[y][x] in sprite_mapping.keys():
+				imageToUse = sprites[sprite_mapping[level[y][x]]]
+			
+			# Special handling to make SMB levels look nicer
+			elif level[y][x]=="X" and domain == "SMB":
+				#Rules about ensuring the right sprite is used
+				if y==level_height-2:
+					imageToUse = sprites["groundTop"]
+				elif y==level_height-1:
+					#Check if we have a solid tile above or not
+					if level[y-1][x]=="X":
+						imageToUse = sprites["groundBottom"]
+					else:
+						imageToUse = sprites["groundTop"]
+				else:
+					imageToUse = sprites["stair"]
+			
+			if not imageToUse == None:
+				pixelsToUse = imageToUse.load()
+				for x2 in range(0, 18):
+					for y2 in range(0, 18):
+						if pixelsToUse[x2,y2][3]>0:
+							pixels[x*18+x2,y*18+y2] = pixelsToUse[x2,y2][0:-1]
+
+	return image
+
+def load_sprites(domain):
+	sprites = {}
+	for filename in glob.glob(f"./Sprites/{domain}/*.png"):
+		im = Image.open(filename)
+		name = filename.split("/")[-1].split(".")[0]
+		sprites[name] = im.convert('RGBA')
+
+	return sprites
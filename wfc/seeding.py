@@ -0,0 +1,45 @@
+import random
+
+
+# Random number streams for training and generation. Every function that makes
+# random choices takes an 'rng' argument, which can be
+#	None - a seed is drawn from the global random module, so seeding it with
+#		random.seed still makes the results reproducible
+#	an int - used as the seed
+#	a random.Random instance (or the random module) - a seed is drawn from it
+#	a NumPy Generator - a seed is drawn from it with its 'integers' method
+# The choices themselves are always made with a random.Random of their own, so
+# generations running in parallel threads don't share any random state.
+#
+# Independent streams, such as one per level and one per generation attempt,
+# are derived from a seed with 'derive_seed'. A derived stream only depends
+# on the seed and its keys, so the streams can be recreated in any order, and
+# in any process.
+
+def make_seed(rng=None):
+	if rng is None:
+		return random.getrandbits(64)
+	if isinstance(rng, int):
+		return rng
+	if hasattr(rng, "getrandbits"):
+		return rng.getrandbits(64)
+	if hasattr(rng, "integers"):
+		return int(rng.integers(2**63))
+
+	raise TypeError("'rng' must be None, an int seed, a random.Random or a "+
+							f"NumPy Generator, but {type(rng).__name__} was given.")
+
+def make_rng(rng=None):
+	if isinstance(rng, random.Random):
+		return rng
+	return random.Random(make_seed(rng))
+
+# The seed of the stream identified by 'keys' (ints or strings) within the
+# stream of 'seed'. Seeding random.Random with a string hashes it with SHA-512,
+# which doesn't depend on the process (unlike hash()).
+def derive_seed(seed, *keys):
+	return random.Random("/".join(str(key) for key in (seed,) + keys)
+															).getrandbits(64)
+
+def substream(seed, *keys):
+	return random.Random(derive_seed(seed, *keys))
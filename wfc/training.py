@@ -0,0 +1,306 @@
+import array
+
+from wfc.patterns import pattern_to_tuple
+from wfc.seeding import make_rng
+
+
+# This corresponds to the WFC color example in Chapter 5
+# You can change this example, or the arguments set at
+# the bottom of the file for this domain to play with
+# how the domain is modeled (e.g., size of the patterns)
+def load_colors_domain():
+	examples = [[
+		['W', 'W', 'W', 'W'],
+		['W', 'B', 'B', 'B'],
+		['W', 'B', 'R', 'B'],
+		['W', 'B', 'B', 'B']]]
+	return examples
+
+# Load the example levels matching the glob patterns in 'paths'. If 'subset'
+# is given, that many examples are sampled with 'rng' (see wfc/seeding.py).
+# The files are read in sorted order, so the same seed samples the same 
+# examples on every machine.
+def load_examples(paths, subset=None, rng=None):
+	import glob
+
+	examples = []
+
+	for path in paths:
+		for levelFile in sorted(glob.glob(path)):
+			with open(levelFile) as fp:
+				level = []
+				for line in fp:
+					row = []
+					for cell in line:
+						if cell not in ['\n', '\t', '\r']:
+							row.append(cell)
+					level.append(row)
+				
+				examples.append(level)
+
+	if isinstance(subset, int) and subset < len(examples):
+		examples = make_rng(rng).choices(examples, k=subset)
+
+	return examples
+
+# Find all the pattern_height X pattern_width size patterns in the examples
+# Assumes an overlapping model
+def extract_patterns(examples, pattern_height, pattern_width, row_offset=1, 
+												col_offset=1, wrapping=False):
+	extracted_patterns = []
+
+	for example in examples:
+		for row_index, col_index, current_pattern in iterate_patterns(example, 
+									pattern_height, pattern_width, row_offset, 
+									col_offset, wrapping):
+			extracted_patterns.append(current_pattern)
+
+	return extracted_patterns
+
+# yields (row_index, col_index, pattern) for every pattern in the example, 
+# where the row and column are the position of the pattern's top left tile
+def iterate_patterns(example, pattern_height, pattern_width, row_offset, 
+												col_offset, wrapping):
+	ex_height = len(example)
+	ex_width = len(example[0])
+
+	# each position will visited yield a pattern
+	for row_index in range(0, ex_height, row_offset):
+		for col_index in range(0, ex_width, col_offset):
+			
+			# if not using the wrapping version, then skip any positions
+			# that extend beyond the edge of the example
+			if not wrapping and \
+					(col_index + pattern_width > ex_width or \
+					row_index + pattern_height > ex_height):
+				continue
+
+			current_pattern = [
+				[example[(row_index+j)%ex_height][(col_index+i)%ex_width] 
+											for i in range(pattern_width)] 
+											for j in range(pattern_height)]
+
+			yield row_index, col_index, current_pattern
+
+
+# Count how many times each pattern appears in the training examples
+# This is used when selecting a pattern/collapsing a position
+def compute_pattern_occurrences(observed_patterns):
+
+	pattern_counts = {}
+	for pattern in observed_patterns:
+		pattern_as_tuple = pattern_to_tuple(pattern)
+
+		if pattern_as_tuple in pattern_counts:
+			pattern_counts[pattern_as_tuple] += 1
+		else:
+			pattern_counts[pattern_as_tuple] = 1
+	
+	return pattern_counts
+
+# given the observed patterns, get the unique patterns
+# (in the order they were first observed)
+def get_unique_patterns(observed_patterns):
+	unique_patterns = {}
+	for pattern in observed_patterns:
+		pattern_as_tuple = pattern_to_tuple(pattern)
+		if pattern_as_tuple not in unique_patterns:
+			unique_patterns[pattern_as_tuple] = pattern
+
+	return list(unique_patterns.values())
+
+# determine the allowed adjacencies between the observed patterns
+# 
+# Two patterns can be placed next to each other if the parts of them that
+# overlap (see 'get_pattern_slices') are the same. Rather than comparing every 
+# pair of patterns, the patterns are grouped by their slices so that e.g., all 
+# the patterns that can be placed below a pattern are found with a single 
+# lookup of its bottom slice. This keeps training practical for larger 
+# patterns, where there can be thousands of unique patterns.
+#
+# The adjacencies are stored sparsely, per direction, in compressed sparse row
+# (CSR) form: the patterns that can be placed in 'direction' of the pattern with
+# index i are indices[offsets[i]:offsets[i+1]], where the index of a pattern is
+# its position in 'unique_patterns'.
+def compute_adjacencies(unique_patterns, row_offset=1, col_offset=1):
+	slices = [[pattern_to_tuple(pattern_slice) for pattern_slice in 
+					get_pattern_slices(pattern, row_offset, col_offset)]
+										for pattern in unique_patterns]
+
+	# group the pattern indices by each of their slices
+	# (0 = top, 1 = bottom, 2 = left, 3 = right)
+	groups = [{} for i in range(4)]
+	for pattern_index, pattern_slices in enumerate(slices):
+		for slice_index, pattern_slice in enumerate(pattern_slices):
+			groups[slice_index].setdefault(pattern_slice, []).append(pattern_index)
+
+	# for each direction, which of the pattern's slices must match which slice
+	# of the other pattern. e.g., p_2 can be placed below p_1 if the bottom of
+	# p_1 is the same as the top of p_2
+	matching_slices = {"above": (0, 1), "below": (1, 0), 
+						"left": (2, 3), "right": (3, 2)}
+
+	adjacencies = {}
+	for direction, (own_slice, other_slice) in matching_slices.items():
+		offsets = array.array("i", [0])
+		indices = array.array("i")
+		for pattern_slices in slices:
+			indices.extend(groups[other_slice].get(pattern_slices[own_slice], []))
+			offsets.append(len(indices))
+
+		adjacencies[direction] = {"offsets": offsets, "indices": indices}
+
+	return adjacencies
+
+# helper function for the 'compute_adjacencies' which gets the
+# sections of the provided pattern which are used to determine overlap/adjacency
+# This essentially, gets the partial pieces of a given pattern to be used
+# for determining which patterns can overlap in which ways
+# e.g., we get the top portion of the pattern (as determined by the offsets)
+# and then we can check for other patterns  if the top of pattern A is the same
+# as the bottom of pattern B. Which tells us which patterns can be placed next
+# to each other.
+# This function just computes the partial pattern chunks, and the function
+# above does the computing of which adjacencies are allowed
+def get_pattern_slices(pattern, row_offset, col_offset):
+	height = len(pattern)
+	width = len(pattern[0])
+
+	p_top, p_bottom = ([[None for c in range(width)] 
+										for r in range(height-row_offset)] 
+															for i in range(2))
+	p_left, p_right = ([[None for c in range(width-col_offset)] 
+										for r in range(height)] 
+															for i in range(2))
+
+	
+	for row_index in range(height):
+		for col_index in range(width):
+			if row_index < height - row_offset:
+				p_top[row_index][col_index] = pattern[row_index][col_index]
+
+			if row_index >= row_offset:
+				p_bottom[row_index-row_offset][col_index] = \
+												pattern[row_index][col_index]
+
+			if col_index < width - col_offset:
+				p_left[row_index][col_index] = pattern[row_index][col_index]
+
+			if col_index >= col_offset:
+				p_right[row_index][col_index-col_offset] = \
+												pattern[row_index][col_index]
+
+	return p_top, p_bottom, p_left, p_right
+
+
+# Train a WFC model on the examples. If a cache is given (see wfc/cache.py),
+# the model is looked up by the examples and the arguments first.
+def train_model(examples, domain, pattern_height, pattern_width, row_offset=1,
+								col_offset=1, wrapping=False, cache=None):
+	if cache is not None:
+		from wfc.cache import hash_key
+		key = hash_key("model", examples, domain, pattern_height, pattern_width,
+											row_offset, col_offset, wrapping)
+		return cache.get_or_compute(key, lambda: train_model(examples, domain, 
+								pattern_height, pattern_width, row_offset=row_offset,
+								col_offset=col_offset, wrapping=wrapping))
+
+	all_patterns = extract_patterns(examples, pattern_height, pattern_width, 
+									row_offset=row_offset, col_offset=col_offset, 
+																wrapping=wrapping)
+
+	pattern_occurrences = compute_pattern_occurrences(all_patterns)
+
+	unique_patterns = get_unique_patterns(all_patterns)
+
+	learned_adjacencies = compute_adjacencies(unique_patterns, 
+												row_offset=row_offset, 
+												col_offset=col_offset)
+
+	# the pattern order matches the indices used in the sparse adjacencies
+	patterns = [pattern_to_tuple(pattern) for pattern in unique_patterns]
+
+	trained_WFC_model = {
+					"domain": domain,
+					"pattern_height":pattern_height,
+					"pattern_width":pattern_width,
+					"row_offset":row_offset,
+					"col_offset":col_offset,
+					"patterns": patterns,
+					"sparse_adjacencies": learned_adjacencies,
+					"pattern_counts": pattern_occurrences
+					}
+
+	return trained_WFC_model
+
+
+# The coarse patterns used by the region model are this many regions in size
+REGION_PATTERN_SIZE = 2
+
+# Downsample an example to a grid of region types, where every 
+# region_height X region_width block of tiles becomes a single region, 
+# whose type is the most common tile in the block
+def downsample_example(example, region_height, region_width):
+	ex_height = len(example)
+	ex_width = len(example[0])
+
+	downsampled_example = []
+	for row_index in range(0, ex_height, region_height):
+		row = []
+		for col_index in range(0, ex_width, region_width):
+			tile_counts = {}
+			for r in range(row_index, min(row_index + region_height, ex_height)):
+				for c in range(col_index, min(col_index + region_width, ex_width)):
+					tile_counts[example[r][c]] = tile_counts.get(example[r][c], 0) + 1
+			row.append(max(tile_counts, key=tile_counts.get))
+		downsampled_example.append(row)
+
+	return downsampled_example
+
+# Train the coarse model used for hierarchical generation (see 
+# wfc/hierarchical.py). This is a WFC model of the region types of the 
+# downsampled examples, along with how often each pattern of the tile level
+# model occurs within each type of region. Cached like 'train_model'.
+def train_region_model(examples, domain, region_height, region_width, 
+								pattern_height, pattern_width, row_offset=1, 
+								col_offset=1, wrapping=False, cache=None):
+	if cache is not None:
+		from wfc.cache import hash_key
+		key = hash_key("regions", examples, domain, region_height, region_width,
+								pattern_height, pattern_width, row_offset, 
+								col_offset, wrapping)
+		return cache.get_or_compute(key, lambda: train_region_model(examples, 
+								domain, region_height, region_width, 
+								pattern_height, pattern_width, 
+								row_offset=row_offset, col_offset=col_offset, 
+								wrapping=wrapping))
+
+	downsampled_examples = [downsample_example(example, region_height, 
+										region_width) for example in examples]
+
+	# keep the coarse patterns within the size of the downsampled examples
+	min_height = min(len(example) for example in downsampled_examples)
+	min_width = min(len(example[0]) for example in downsampled_examples)
+	region_model = train_model(downsampled_examples, domain, 
+								min(REGION_PATTERN_SIZE, min_height), 
+								min(REGION_PATTERN_SIZE, min_width), 
+								wrapping=wrapping)
+
+	region_pattern_occurrences = {}
+	for example, downsampled_example in zip(examples, downsampled_examples):
+		for row_index, col_index, pattern in iterate_patterns(example, 
+									pattern_height, pattern_width, row_offset, 
+									col_offset, wrapping):
+			region_type = downsampled_example[row_index // region_height]\
+												[col_index // region_width]
+			pattern_counts = region_pattern_occurrences.setdefault(region_type, {})
+			pattern_as_tuple = pattern_to_tuple(pattern)
+			pattern_counts[pattern_as_tuple] = \
+								pattern_counts.get(pattern_as_tuple, 0) + 1
+
+	return {
+			"region_height": region_height,
+			"region_width": region_width,
+			"model": region_model,
+			"pattern_counts": region_pattern_occurrences
+			}